@@ -0,0 +1,7 @@
+"""Asyncio probe collector (traquarium-collectd); see ingest.collector"""
+
+import sys
+from ingest.collector import main
+
+if __name__ == "__main__":
+    sys.exit(main())
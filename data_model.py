@@ -1,10 +1,20 @@
 from datetime import datetime
-import json
+import contextlib
 import os
+import numpy as np
+from storage import (JournalStorage, SQLiteStorage, SegmentStorage, RecordStorage, PartitionedStorage,
+                     ShardedStorage, ReadingStore, RollupPyramid, TimeIndex, ReadingAggregates,
+                     WriteBehindStorage, UserLock)
+from storage.column_store import parse_timestamp, to_epoch
+from validation import ValidationHelper
 
 class WaterReading:
-    def __init__(self, name: str, pH: float, temperature: float, ammonia: float, timestamp: str = None):
+    def __init__(self, name: str, pH: float, temperature: float, ammonia: float, timestamp: str = None,
+                 reading_id: int = None):
+        self.id = reading_id
         self.timestamp = timestamp if timestamp else datetime.now().strftime("%Y-%m-%d %H:%M")
+        # Parsed once here; everything downstream works on epoch seconds
+        self.epoch = parse_timestamp(self.timestamp)
         self.name = name
         self.pH = pH
         self.temperature = temperature
@@ -12,6 +22,7 @@ class WaterReading:
 
     def to_dict(self):
         return {
+            "id": self.id,
             "timestamp": self.timestamp,
             "name": self.name,
             "pH": self.pH,
@@ -19,45 +30,542 @@ class WaterReading:
             "ammonia": self.ammonia,
         }
 
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["name"], d["pH"], d["temperature"], d["ammonia"], d["timestamp"], d.get("id"))
+
+
+def validate_readings(readings):
+    """Check WaterReading objects or reading dicts against the input rules.
+
+    Returns (records, rejects): normalised reading dicts for the valid items
+    (missing timestamps become now, missing ids None) and an (index,
+    message) pair for every invalid one. An id has to be a whole number
+    that fits the int64 id column.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    records, rejects = [], []
+    for index, reading in enumerate(readings):
+        if isinstance(reading, WaterReading):
+            reading = reading.to_dict()
+        try:
+            name, ph, temp, ammonia = (reading["name"], reading["pH"],
+                                       reading["temperature"], reading["ammonia"])
+        except KeyError as e:
+            rejects.append((index, f"Missing field: {e}"))
+            continue
+        except TypeError:
+            rejects.append((index, "Not a reading."))
+            continue
+        timestamp, reading_id = reading.get("timestamp"), reading.get("id")
+        valid, msg = ValidationHelper.validate_reading(name, ph, temp, ammonia, timestamp)
+        if valid and reading_id is not None:
+            valid, msg = ValidationHelper.validate_id(reading_id, "Reading id")
+        if not valid:
+            rejects.append((index, msg))
+            continue
+        if reading_id is not None:
+            reading_id = int(reading_id)
+        records.append({"id": reading_id, "timestamp": timestamp or now, "name": name,
+                        "pH": float(ph), "temperature": float(temp), "ammonia": float(ammonia)})
+    return records, rejects
+
+
+class ReadingEvent:
+    """Change notification sent to ReadingManager subscribers.
+
+    rows holds the affected reading dicts: the new rows for ADDED, the rows
+    after the change for UPDATED (with the old values in previous) and the
+    removed rows for DELETED. RELOADED means the whole dataset was replaced
+    and carries no rows.
+    """
+
+    ADDED = "added"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    RELOADED = "reloaded"
+
+    def __init__(self, kind, rows=None, previous=None):
+        self.kind = kind
+        self.rows = rows or []
+        self.previous = previous or []
+
+    def names(self):
+        """Lower-cased profile names touched by this event."""
+        return {r["name"].strip().lower() for r in self.rows + self.previous}
+
 
 class ReadingManager:
-    def __init__(self, username: str = None):
-        self.readings = []
+    # Engine name -> (file or folder in the user directory, storage class).
+    # Without an explicit engine the first one whose file exists is used
+    ENGINES = {
+        "sqlite": ("readings.db", SQLiteStorage),
+        "sharded": ("shards", ShardedStorage),
+        "partitioned": ("partitions", PartitionedStorage),
+        "records": ("readings.rec", RecordStorage),
+        "segment": ("readings.seg", SegmentStorage),
+        "json": ("readings.json", JournalStorage),
+    }
+    EDITABLE_FIELDS = ("name", "pH", "temperature", "ammonia")
+
+    def __init__(self, username: str = None, engine: str = None, progress=None, write_behind=False):
+        self.store = ReadingStore()
+        self.pyramid = RollupPyramid(self.store)
+        self.time_index = TimeIndex(self.store)
+        self.aggregates = ReadingAggregates(self.store)
         self.username = username
         self.file_path = None
-
-        base_dir = os.path.join(os.getcwd(), "users")
-        os.makedirs(base_dir, exist_ok=True)
+        self.pyramid_path = None
+        self.storage = None
+        # None once every reading is in the store; otherwise the lower-cased
+        # profile names read so far (see load_readings())
+        self.loaded = None
+        self.summary = None
+        # Profiles the journal appended to before this session (None if it
+        # also held edits); a partial save reads them first
+        self.journaled = None
+        self.on_demand = False
+        self._subscribers = []
 
         if username:
-            user_dir = os.path.join(base_dir, username)
-            os.makedirs(user_dir, exist_ok=True)
-            self.file_path = os.path.join(user_dir, "readings.json")
-            self.load_readings()
+            self.file_path, self.storage = self.open_storage(username, engine)
+            # SQLite, partitioned and sharded engines can read a single profile
+            self.on_demand = hasattr(self.storage, "query")
+            if write_behind:
+                # Changes show up in memory at once and are written on a
+                # background thread; flush() or close() waits for them
+                self.storage = WriteBehindStorage(self.storage)
+            self.pyramid_path = os.path.splitext(self.file_path)[0] + ".rollups.npz"
+            self.load_readings(progress)
+
+    @staticmethod
+    def user_dir(username):
+        """The user's folder under ./users, created if missing."""
+        user_dir = os.path.join(os.getcwd(), "users", username)
+        os.makedirs(user_dir, exist_ok=True)
+        return user_dir
+
+    @classmethod
+    def lock_user(cls, username):
+        """Acquire and return the user's UserLock; raises UserLockedError if it is held.
+
+        Every program that writes readings (the application, the daemons and
+        the HTTP API) holds it for as long as it runs.
+        """
+        return UserLock(cls.user_dir(username)).acquire()
+
+    @classmethod
+    def open_storage(cls, username, engine=None):
+        """(file path, storage) for a user's readings, creating the user folder.
+
+        Without an engine the one whose file already exists is picked.
+        """
+        user_dir = cls.user_dir(username)
+        if engine is None:
+            engine = next((name for name, (file_name, _) in cls.ENGINES.items()
+                           if os.path.exists(os.path.join(user_dir, file_name))), "json")
+        if engine not in cls.ENGINES:
+            raise ValueError(f"Unknown storage engine: {engine}")
+        file_name, storage_class = cls.ENGINES[engine]
+        file_path = os.path.join(user_dir, file_name)
+        return file_path, storage_class(file_path)
+
+    def subscribe(self, callback):
+        """Call callback(event) with a ReadingEvent after every change."""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _emit(self, kind, rows=None, previous=None):
+        if not self._subscribers:
+            return
+        event = ReadingEvent(kind, rows, previous)
+        for callback in list(self._subscribers):
+            callback(event)
 
     def add_reading(self, reading: WaterReading):
-        self.readings.append(reading)
-        self.save_readings()
-        self.load_readings()
+        self._load_for([reading.to_dict()])
+        reading.id = self.store.append(reading.name, reading.epoch,
+                                       reading.pH, reading.temperature, reading.ammonia,
+                                       reading.id)
+        # append() always writes the last row; no need to look the id up
+        self.time_index.add(reading.name, self.store.size - 1, reading.epoch)
+        self.aggregates.add(reading.name, reading.epoch, reading.to_dict())
+        self.pyramid.add(reading.name, reading.epoch,
+                         {"pH": reading.pH, "temperature": reading.temperature, "ammonia": reading.ammonia})
+        added = self.get(reading.id)
+        self._summarize(added=[added])
+        if self.storage:
+            self.storage.append(reading.to_dict())
+            self._compact_if_needed()
+        self._emit(ReadingEvent.ADDED, [added])
+
+    def add_readings(self, readings):
+        """Validate and add many readings with a single storage write.
+
+        readings yields WaterReading objects or reading dicts (timestamp and
+        id optional). Invalid items are skipped; returns (ids, rejects) with
+        the ids of the added readings in order and an (index, message) pair
+        for every rejected item.
+        """
+        records, rejects = validate_readings(readings)
+        if not records:
+            return [], rejects
+        self._load_for(records)
+
+        start = self.store.size
+        self.store.extend(records)
+        rows = np.arange(start, self.store.size)
+        ids = self.store.ids[rows].tolist()
+        for record, reading_id in zip(records, ids):
+            record["id"] = reading_id
+        self.time_index.add_rows(rows)
+        self.aggregates.add_rows(rows)
+        self.pyramid.invalidate({record["name"] for record in records})
+        added = self.store.rows(rows)
+        self._summarize(added=added)
+        if self.storage:
+            self.storage.append_many(records)
+            self._compact_if_needed()
+        self._emit(ReadingEvent.ADDED, added)
+        return ids, rejects
+
+    def get(self, reading_id):
+        """The reading dict with this id, or None."""
+        pos = self.store.position(reading_id)
+        if pos is None and self.loaded is not None:
+            # Not in a profile read so far; ids say nothing about their profile
+            self._load_all()
+            pos = self.store.position(reading_id)
+        if pos is None:
+            return None
+        return self.store.rows([pos])[0]
+
+    def _check_fields(self, fields):
+        """Validate a patch like add_readings() would; returns it with numbers as floats."""
+        unknown = set(fields) - set(self.EDITABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"Cannot update fields: {', '.join(sorted(unknown))}")
+        checked = {}
+        for field, value in fields.items():
+            valid, msg = ValidationHelper.validate_field(field, value)
+            if not valid:
+                raise ValueError(msg)
+            checked[field] = value if field == "name" else float(value)
+        return checked
+
+    def update(self, reading_id, **fields):
+        """Change fields of one reading in place. Returns False if the id is unknown.
+
+        Raises ValueError, changing nothing, if a value fails validation.
+        """
+        fields = self._check_fields(fields)
+        self._load_targets([fields])
+        previous = self.get(reading_id)
+        if previous is None:
+            return False
+        self._update_row(reading_id, previous, fields)
+        self.pyramid.invalidate([previous["name"], fields.get("name", previous["name"])])
+        current = self.get(reading_id)
+        self._summarize(added=[current], removed=[previous])
+        if self.storage:
+            self.storage.update(reading_id, fields)
+            self._compact_if_needed()
+        self._emit(ReadingEvent.UPDATED, [current], [previous])
+        return True
+
+    def update_many(self, patches):
+        """Apply {reading_id: {field: value}} patches as one transaction.
+
+        Every id, field and value is checked before anything changes, so
+        either all patches are applied (and persisted in a single atomic
+        write) or a ValueError is raised and nothing is.
+        """
+        patches = {rid: self._check_fields(fields) for rid, fields in patches.items() if fields}
+        self._load_targets(patches.values())
+        if self.loaded is not None and any(self.store.position(rid) is None for rid in patches):
+            self._load_all()
+        for reading_id in patches:
+            if self.store.position(reading_id) is None:
+                raise ValueError(f"Unknown reading id: {reading_id}")
+        if not patches:
+            return
+        previous = [self.get(reading_id) for reading_id in patches]
+        for old, (reading_id, fields) in zip(previous, patches.items()):
+            self._update_row(reading_id, old, fields)
+        self.pyramid.invalidate([r["name"] for r in previous] +
+                                [f["name"] for f in patches.values() if "name" in f])
+        current = [self.get(reading_id) for reading_id in patches]
+        self._summarize(added=current, removed=previous)
+        if self.storage:
+            self.storage.update_many(patches)
+            self._compact_if_needed()
+        self._emit(ReadingEvent.UPDATED, current, previous)
+
+    def _update_row(self, reading_id, previous, fields):
+        """Update one row in the store, moving it in the time index if needed."""
+        pos = self.store.position(reading_id)
+        old_timestamp = self.store.timestamps[pos]
+        moved = "name" in fields or "timestamp" in fields
+        if moved:
+            self.time_index.remove(previous["name"], pos, old_timestamp)
+        self.store.update(reading_id, fields)
+        name, timestamp = self.store.names[self.store.codes[pos]], self.store.timestamps[pos]
+        if moved:
+            self.time_index.add(name, pos, timestamp)
+        self.aggregates.remove(previous["name"], old_timestamp, previous)
+        self.aggregates.add(name, timestamp, self.store.rows([pos])[0])
+
+    def delete(self, reading_id):
+        """Remove one reading. Returns False if the id is unknown."""
+        removed = self.get(reading_id)
+        if removed is None:
+            return False
+        pos = self.store.position(reading_id)
+        self.time_index.remove(removed["name"], pos, self.store.timestamps[pos])
+        self.aggregates.remove(removed["name"], self.store.timestamps[pos], removed)
+        self.store.delete(reading_id)
+        self.pyramid.invalidate([removed["name"]])
+        self._summarize(removed=[removed])
+        if self.storage:
+            self.storage.delete(reading_id)
+            self._compact_if_needed()
+        self._emit(ReadingEvent.DELETED, [removed])
+        return True
+
+    def _compact_if_needed(self):
+        if self.storage.needs_compaction():
+            self.save_readings()
 
     def get_all(self):
-        return [r.to_dict() for r in self.readings]
+        self._load_all()
+        return self.store.rows()
+
+    def view(self):
+        """All readings as a columnar ReadingView."""
+        self._load_all()
+        return self.store.view()
+
+    def rollups(self, name):
+        """Min/max/mean Rollups of one profile at 1m, 1h, 1d and 1w buckets, finest first."""
+        self._load_profile(name)
+        return self.pyramid.levels(name)
+
+    def rollup(self, name, period="1d", start=None, end=None):
+        """Pre-aggregated buckets of one profile as {column: array}.
+
+        period is "1m", "1h", "1d" or "1w". Columns are start (bucket start,
+        epoch seconds), count and <field>_min/_max/_mean; start and end bound
+        the bucket start times. Built from the saved rollups file, or from
+        the readings the first time a profile is asked for.
+        """
+        start = None if start is None else to_epoch(start)
+        end = None if end is None else to_epoch(end)
+        self._load_profile(name)
+        return self.pyramid.level(name, period).table(start, end)
+
+    def latest(self):
+        """The most recent reading dict by timestamp, or None."""
+        summary = self._summary()
+        if summary is not None:
+            # Only the partitions holding the newest timestamp are opened
+            totals = summary[0]
+            if not totals.count:
+                return None
+            readings = self.storage.query(start=totals.last)
+            if readings:
+                return readings[int(np.argsort(readings.timestamps, kind="stable")[-1])]
+        readings = self.query(limit=1)
+        return readings[0] if readings else None
+
+    def totals(self):
+        """RunningTotals of every reading: count, time span and sums for the means."""
+        summary = self._summary()
+        return self.aggregates.totals() if summary is None else summary[0]
+
+    def profile_count(self):
+        """How many profiles have readings."""
+        summary = self._summary()
+        return self.aggregates.profile_count if summary is None else len(summary[1])
+
+    def has_profile(self, name):
+        summary = self._summary()
+        if summary is not None:
+            return name.strip().lower() in summary[1]
+        return self.store.has_name(name)
+
+    def query(self, name=None, start=None, end=None, limit=None):
+        """Readings of one profile (all profiles when name is None) in time order.
+
+        start and end are inclusive epoch seconds or timestamp strings; limit
+        keeps only the latest readings of the window. The window is found by
+        binary search over the time index, so the cost is O(log n + k).
+        """
+        if name is None:
+            self._load_all()
+        else:
+            self._load_profile(name)
+        start = None if start is None else to_epoch(start)
+        end = None if end is None else to_epoch(end)
+        return self.store.view(self.time_index.window(name, start, end, limit))
 
     def clear_readings(self):
-        self.readings.clear()
+        self.store.clear()
+        self.loaded = None
+        self.pyramid.invalidate()
+        self.aggregates.rebuild()
         self.save_readings()
+        self._emit(ReadingEvent.RELOADED)
 
     def save_readings(self):
-        if not self.file_path:
+        """Write a full snapshot and truncate the journal (compaction).
+
+        With write_behind the snapshot is taken now and written in the background.
+        """
+        if not self.storage:
             return
-        with open(self.file_path, "w") as f:
-            json.dump([r.to_dict() for r in self.readings], f, indent=4)
+        if self.loaded is not None and self.journaled is not None:
+            # The journal is folded in and removed, so whatever it appended
+            # has to be in the store; profiles not read stay as saved
+            for key in self.journaled:
+                self._load_profile(key)
+            self.storage.save_from(self.store, set(self.loaded))
+            self.journaled = set()
+        else:
+            # Saving needs every reading in the store
+            self._load_all()
+            self.storage.save_from(self.store)
+        self.pyramid.save(self.pyramid_path, self.loaded)
 
-    def load_readings(self):
-        if not self.file_path or not os.path.exists(self.file_path):
+    def flush(self, lock=None):
+        """Wait until every change is written to storage (see WriteBehindStorage).
+
+        If a background write failed, a snapshot of everything is queued
+        before the error is raised, so the change is not lost if the caller
+        carries on; the next flush() raises until that snapshot succeeds.
+        A caller that waits outside its own lock passes it as lock, to be
+        held while the snapshot is taken.
+        """
+        flush = getattr(self.storage, "flush", None)
+        if not flush:
             return
-        
-        with open(self.file_path, "r") as f:
-            data = json.load(f)
-        
-        self.readings = [WaterReading(d["name"], d["pH"], d["temperature"], d["ammonia"], d["timestamp"]) for d in data]
\ No newline at end of file
+        try:
+            flush()
+        except Exception:
+            with lock or contextlib.nullcontext():
+                self.save_readings()
+            raise
+
+    def close(self):
+        """Write outstanding changes and new rollups, and release the storage."""
+        try:
+            if self.storage and self.pyramid.dirty:
+                # Otherwise rollups are only saved on compaction, which
+                # SQLite never needs, and would be rebuilt on every start
+                self.pyramid.save(self.pyramid_path, self.loaded)
+        finally:
+            close = getattr(self.storage, "close", None)
+            if close:
+                close()
+
+    def load_readings(self, progress=None):
+        """Reload every reading from storage.
+
+        progress(done, total) is called while a large JSON snapshot loads;
+        other engines load too quickly to report. Engines that can query a
+        single profile (SQLite, partitioned, sharded) read nothing here: a
+        profile is read when it is first asked for or changed, and everything
+        else the first time something needs every reading (the history table).
+        """
+        if not self.storage:
+            return
+        self.store.clear()
+        self.summary = None
+        # Saved rollups are kept for profiles whose rows have not changed.
+        # Both passes read every row, so they wait until first use instead
+        # of faulting in a memory-mapped file at login
+        self.pyramid.load(self.pyramid_path)
+        self.aggregates.invalidate()
+        if self.on_demand and os.path.exists(self.file_path):
+            self.loaded = set()
+            self.journaled = self.storage.journaled_profiles()
+        else:
+            self._read_all(progress)
+        self._emit(ReadingEvent.RELOADED)
+
+    def _read_all(self, progress=None):
+        assigned = self.storage.load_into(self.store, progress)
+        self.loaded = None
+        if assigned or not os.path.exists(self.file_path):
+            # Older files have no reading ids; persist the ones just assigned.
+            # A new user also gets a snapshot right away, since the engine is
+            # detected from it on the next login
+            self.save_readings()
+
+    def _load_all(self):
+        """Read every reading if load_readings() left some profiles on disk."""
+        if self.loaded is None:
+            return
+        self.store.clear()
+        self._read_all()
+        self.aggregates.invalidate()
+        # Rows of the profiles read earlier have moved
+        self._emit(ReadingEvent.RELOADED)
+
+    def _load_profile(self, name):
+        """Read one profile from storage if it is not in the store yet."""
+        key = name.strip().lower()
+        if self.loaded is None or key in self.loaded:
+            return
+        readings = self.storage.query(name)
+        start = self.store.size
+        self.store.extend_columns(*readings.store.columns(readings.indices))
+        self.time_index.add_rows(np.arange(start, self.store.size))
+        self.loaded.add(key)
+
+    def _load_for(self, records):
+        """Read what adding records needs: their profiles, or everything if they bring ids."""
+        if self.loaded is None:
+            return
+        if any(record.get("id") is not None for record in records):
+            # Only the whole store can tell whether an id is taken
+            self._load_all()
+            return
+        for name in {record["name"] for record in records}:
+            self._load_profile(name)
+
+    def _load_targets(self, patches):
+        """Read the profiles that patches move readings into."""
+        for fields in patches:
+            if "name" in fields:
+                self._load_profile(fields["name"])
+
+    def _summarize(self, added=(), removed=()):
+        """Keep the storage totals of a partly read store in step with a change."""
+        if self.loaded is None or self.summary is None:
+            return
+        totals, names = self.summary
+        for row in removed:
+            totals.remove(parse_timestamp(row["timestamp"]), row)
+            if not self.store.has_name(row["name"]):
+                names.discard(row["name"].strip().lower())
+        for row in added:
+            totals.add(parse_timestamp(row["timestamp"]), row)
+            names.add(row["name"].strip().lower())
+        if totals.bounds_stale:
+            # The new first or last reading may be in a profile not read yet
+            self.summary = None
+
+    def _summary(self):
+        """Storage totals while only some profiles are loaded (see PartitionedStorage.totals)."""
+        if self.loaded is None:
+            return None
+        if self.summary is None:
+            self.summary = self.storage.totals()
+            if self.summary is None:
+                # The journal has edits the manifest cannot account for
+                self._load_all()
+        return self.summary
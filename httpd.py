@@ -0,0 +1,7 @@
+"""Local HTTP reading API (traquarium-httpd); see ingest.server"""
+
+import sys
+from ingest.server import main
+
+if __name__ == "__main__":
+    sys.exit(main())
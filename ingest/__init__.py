@@ -0,0 +1,6 @@
+"""Headless reading ingestion (no Qt)"""
+
+from .collector import Collector, FakeProbe, ProbeSource, TcpProbe
+from .protocol import parse_line
+from .server import ReadingService
+from .writer import BatchWriter
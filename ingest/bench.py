@@ -0,0 +1,120 @@
+"""Load test for traquarium-httpd: requests per second and latency percentiles"""
+
+import argparse
+import http.client
+import json
+import random
+import socket
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class Client(threading.Thread):
+    """One keep-alive connection sending a mix of writes and reads until the deadline."""
+
+    def __init__(self, connect, deadline, profiles, write_share, batch):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.deadline = deadline
+        self.profiles = profiles
+        self.write_share = write_share
+        self.batch = batch
+        self.random = random.Random()
+        self.latencies = {"write": [], "latest": [], "range": []}
+        self.errors = 0
+
+    def request(self, kind):
+        name = self.random.choice(self.profiles)
+        if kind == "write":
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            lines = [json.dumps({"name": name, "pH": round(self.random.uniform(6.5, 8.0), 2),
+                                 "temperature": round(self.random.uniform(22, 28), 2),
+                                 "ammonia": round(self.random.uniform(0, 0.5), 2), "timestamp": now})
+                     for _ in range(self.batch)]
+            return "POST", "/readings", "\n".join(lines).encode("utf-8"), {"Content-Type": "application/x-ndjson"}
+        if kind == "latest":
+            return "GET", f"/profiles/{quote(name)}/latest", None, {}
+        return "GET", f"/profiles/{quote(name)}/range?limit=100", None, {}
+
+    def run(self):
+        connection = self.connect()
+        while time.perf_counter() < self.deadline:
+            roll = self.random.random()
+            kind = "write" if roll < self.write_share else "latest" if roll < (1 + self.write_share) / 2 else "range"
+            method, path, body, headers = self.request(kind)
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500 or kind == "write" and response.status != 201:
+                    self.errors += 1
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                connection.close()
+                connection = self.connect()
+                continue
+            self.latencies[kind].append(time.perf_counter() - started)
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m ingest.bench", description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent connections (default: 16)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run (default: 10)")
+    parser.add_argument("--profiles", type=int, default=50, help="profile names to spread requests over")
+    parser.add_argument("--writes", type=float, default=0.5, help="share of requests that are writes (default: 0.5)")
+    parser.add_argument("--batch", type=int, default=1, help="readings per write request (default: 1)")
+    args = parser.parse_args(argv)
+
+    if args.socket:
+        def connect():
+            return UnixHTTPConnection(args.socket)
+    else:
+        def connect():
+            return http.client.HTTPConnection(args.host, args.port, timeout=30)
+
+    profiles = [f"Bench Tank {i + 1}" for i in range(args.profiles)]
+    deadline = time.perf_counter() + args.duration
+    clients = [Client(connect, deadline, profiles, args.writes, args.batch) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(samples) for client in clients for samples in client.latencies.values())
+    print(f"{total} requests in {elapsed:.1f} s: {total / elapsed:.0f} req/s, "
+          f"{sum(client.errors for client in clients)} errors")
+    for kind in ("write", "latest", "range"):
+        samples = [latency for client in clients for latency in client.latencies[kind]]
+        if samples:
+            print(f"  {kind:6} {len(samples) / elapsed:8.0f} req/s  p50 {percentile(samples, 0.5) * 1000:6.2f} ms"
+                  f"  p99 {percentile(samples, 0.99) * 1000:6.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
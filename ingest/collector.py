@@ -0,0 +1,267 @@
+"""Asyncio collector that polls many probes in one process"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import signal
+import time
+from datetime import datetime
+from storage import UserLockedError
+from .protocol import parse_line
+from .writer import BatchWriter
+
+log = logging.getLogger("traquarium.collector")
+
+# Seconds a failing probe waits before it is polled again
+RETRY_DELAY = 5.0
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ProbeSource:
+    """A probe polled every interval seconds; subclasses implement measure().
+
+    The first poll is at a random point within the first interval, so
+    thousands of probes with the same interval do not all fire at once.
+    """
+
+    def __init__(self, name, interval=60.0):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.name = name
+        self.interval = interval
+        self._next = None
+
+    async def read(self):
+        """Wait for the next poll and return its reading dict."""
+        now = time.monotonic()
+        if self._next is None:
+            self._next = now + random.uniform(0, self.interval)
+        if self._next > now:
+            await asyncio.sleep(self._next - now)
+        # Skip missed polls rather than catching up on them in a burst
+        self._next = max(self._next + self.interval, time.monotonic())
+        return await self.measure()
+
+    async def measure(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class FakeProbe(ProbeSource):
+    """In-process stand-in probe whose values drift randomly around healthy levels."""
+
+    def __init__(self, name, interval=60.0, seed=None):
+        super().__init__(name, interval)
+        self.random = random.Random(seed)
+        self.values = {"pH": 7.2, "temperature": 25.0, "ammonia": 0.05}
+
+    async def measure(self):
+        values = self.values
+        values["pH"] = min(max(values["pH"] + self.random.gauss(0, 0.02), 6.0), 8.5)
+        values["temperature"] = min(max(values["temperature"] + self.random.gauss(0, 0.1), 20.0), 30.0)
+        values["ammonia"] = min(max(values["ammonia"] + self.random.gauss(0, 0.01), 0.0), 2.0)
+        reading = {f: round(value, 2) for f, value in values.items()}
+        reading.update(name=self.name, timestamp=_now())
+        return reading
+
+
+class TcpProbe(ProbeSource):
+    """Probe behind a TCP socket that answers each command line with one reading line.
+
+    The reply uses the ingest line protocol (JSON or CSV); its name is
+    replaced by this probe's name and a missing timestamp becomes the poll
+    time. The connection is opened on the first poll and reopened after
+    any error.
+    """
+
+    def __init__(self, name, host, port, interval=60.0, timeout=5.0, command=b"READ\n"):
+        super().__init__(name, interval)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.command = command
+        self.stream = None
+
+    async def measure(self):
+        try:
+            if self.stream is None:
+                self.stream = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                     self.timeout)
+            reader, writer = self.stream
+            writer.write(self.command)
+            await writer.drain()
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError("Probe closed the connection")
+            reading = parse_line(line.decode("utf-8"))
+        except BaseException:
+            await self.close()
+            raise
+        if reading is None:
+            raise ValueError("Probe sent an empty reading")
+        reading["name"] = self.name
+        if not reading.get("timestamp"):
+            reading["timestamp"] = _now()
+        return reading
+
+    async def close(self):
+        if self.stream is not None:
+            writer = self.stream[1]
+            self.stream = None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class Collector:
+    """Polls every source in its own task and writes their readings in batches.
+
+    Readings go through a bounded queue: when the writer falls behind, the
+    queue fills and pollers wait in put(), so memory stays bounded and
+    probes are simply read late. A single writer task takes up to
+    writer.batch_size readings, or whatever arrived within flush_interval
+    seconds of the first one, and hands them to BatchWriter.write() in a
+    worker thread so disk I/O never blocks the event loop.
+    """
+
+    def __init__(self, writer, sources, queue_size=10000, flush_interval=None):
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+        self.writer = writer
+        self.sources = list(sources)
+        self.queue_size = queue_size
+        self.flush_interval = writer.max_delay if flush_interval is None else flush_interval
+        self.polled = 0
+        self.failures = 0
+        self.queue = None
+        self.stopping = None
+
+    def stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def run(self):
+        """Poll until stop() is called, then write what was collected."""
+        self.queue = asyncio.Queue(self.queue_size)
+        self.stopping = asyncio.Event()
+        pollers = [asyncio.create_task(self.poll(source)) for source in self.sources]
+        writing = asyncio.create_task(self.write_batches())
+        # If writing fails, stop polling and let run() raise its error
+        writing.add_done_callback(lambda task: self.stopping.set())
+        await self.stopping.wait()
+        for task in pollers:
+            task.cancel()
+        await asyncio.gather(*pollers, return_exceptions=True)
+        try:
+            if not writing.done():
+                await self.queue.put(None)
+            await writing
+        finally:
+            # Releases the user's lock even if a write failed
+            await asyncio.to_thread(self.writer.close)
+
+    async def poll(self, source):
+        try:
+            while True:
+                try:
+                    reading = await source.read()
+                except (OSError, ValueError, asyncio.TimeoutError) as e:
+                    self.failures += 1
+                    log.warning("Probe %s failed: %s", source.name, e or type(e).__name__)
+                    await asyncio.sleep(RETRY_DELAY)
+                    continue
+                await self.queue.put(reading)
+                self.polled += 1
+        finally:
+            await source.close()
+
+    async def write_batches(self):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            first = await self.queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.writer.batch_size:
+                if self.queue.empty():
+                    try:
+                        reading = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    reading = self.queue.get_nowait()
+                if reading is None:
+                    done = True
+                    break
+                batch.append(reading)
+            await asyncio.to_thread(self.writer.write, batch)
+
+
+def load_sources(path):
+    """TcpProbe sources from a JSON list of {"name", "host", "port"[, "interval", "timeout"]}."""
+    with open(path, "r") as f:
+        config = json.load(f)
+    sources = []
+    for entry in config:
+        try:
+            sources.append(TcpProbe(entry["name"], entry["host"], int(entry["port"]),
+                                    float(entry.get("interval", 60.0)), float(entry.get("timeout", 5.0))))
+        except KeyError as e:
+            raise ValueError(f"Probe entry missing {e}: {entry}") from None
+    return sources
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="traquarium-collectd", description=__doc__)
+    parser.add_argument("--user", required=True, help="user whose readings are recorded")
+    parser.add_argument("--data-dir", default=".", help="folder holding the users folder (default: current)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--probes", help="JSON file listing the TCP probes to poll")
+    source.add_argument("--fake", type=int, metavar="N", help="poll N in-process fake probes instead")
+    parser.add_argument("--engine", help="storage engine (default: the one the user already has)")
+    parser.add_argument("--interval", type=float, default=60.0,
+                        help="seconds between polls of a fake probe (default: 60)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="readings per write (default: 1000)")
+    parser.add_argument("--flush-interval", type=float, default=2.0,
+                        help="seconds a reading may wait before its batch is written (default: 2)")
+    parser.add_argument("--queue-size", type=int, default=10000,
+                        help="readings buffered before probes are held back (default: 10000)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.probes:
+        sources = load_sources(args.probes)
+    else:
+        sources = [FakeProbe(f"Tank {i + 1}", args.interval, seed=i) for i in range(args.fake)]
+    os.chdir(args.data_dir)
+    try:
+        writer = BatchWriter(args.user, args.engine, args.batch_size, args.flush_interval,
+                             on_reject=lambda reading, message: log.warning("Rejected %r: %s", reading, message))
+    except UserLockedError as e:
+        log.error("%s", e)
+        return 1
+    collector = Collector(writer, sources, args.queue_size, args.flush_interval)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, collector.stop)
+        loop.add_signal_handler(signal.SIGINT, collector.stop)
+        await collector.run()
+
+    log.info("Polling %d probes for %s into %s", len(sources), args.user, writer.file_path)
+    asyncio.run(run())
+    log.info("Stopped: %d readings polled, %d written, %d rejected, %d probe failures",
+             collector.polled, writer.written, writer.rejected, collector.failures)
+    return 0
@@ -0,0 +1,139 @@
+"""traquarium-ingestd: record probe readings without the GUI"""
+
+import argparse
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from storage import UserLockedError
+from .protocol import parse_line
+from .writer import BatchWriter
+
+log = logging.getLogger("traquarium.ingestd")
+
+# Also how often the spool folder is scanned
+POLL_INTERVAL = 1.0
+
+
+class SpoolDirectory:
+    """Folder that producers drop reading files into.
+
+    Producers write a file under any other name and rename it to *.jsonl or
+    *.csv when complete; each line is one reading in the line protocol.
+    A file is deleted only after its readings have been written.
+    """
+
+    SUFFIXES = (".jsonl", ".csv")
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def ready_files(self):
+        names = sorted(name for name in os.listdir(self.path) if name.endswith(self.SUFFIXES))
+        return [os.path.join(self.path, name) for name in names]
+
+
+def read_stdin(lines):
+    """Feed stdin lines into the bounded queue (blocking when it is full), then None."""
+    for line in sys.stdin:
+        lines.put(line)
+    lines.put(None)
+
+
+class IngestDaemon:
+    def __init__(self, writer, spool=None, use_stdin=True):
+        self.writer = writer
+        self.spool = spool
+        # Bounded, so a fast producer is slowed down instead of growing memory
+        self.lines = queue.Queue(maxsize=writer.batch_size * 4) if use_stdin else None
+        self.stopping = threading.Event()
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def add_line(self, line, origin):
+        try:
+            reading = parse_line(line)
+        except ValueError as e:
+            self.writer.rejected += 1
+            log.warning("Rejected %s line %r: %s", origin, line.strip(), e)
+            return
+        if reading is not None:
+            self.writer.add(reading)
+
+    def drain_spool(self):
+        for path in self.spool.ready_files():
+            with open(path, "r") as f:
+                for line in f:
+                    self.add_line(line, os.path.basename(path))
+            self.writer.flush()
+            os.remove(path)
+
+    def run(self):
+        if self.lines is not None:
+            threading.Thread(target=read_stdin, args=(self.lines,), daemon=True).start()
+        try:
+            self._loop()
+        finally:
+            # Writes what is pending and releases the user's lock, even after a write error
+            self.writer.close()
+        log.info("Stopped: %d readings written, %d rejected", self.writer.written, self.writer.rejected)
+
+    def _loop(self):
+        next_poll = 0.0
+        stdin_open = self.lines is not None
+        while not self.stopping.is_set():
+            if self.spool and time.monotonic() >= next_poll:
+                self.drain_spool()
+                next_poll = time.monotonic() + POLL_INTERVAL
+            if not stdin_open and not self.spool:
+                break
+            wait = self.writer.timeout()
+            wait = POLL_INTERVAL if wait is None else min(wait, POLL_INTERVAL)
+            if stdin_open:
+                try:
+                    line = self.lines.get(timeout=wait)
+                except queue.Empty:
+                    line = ""
+                if line is None:
+                    stdin_open = False
+                elif line:
+                    self.add_line(line, "stdin")
+            else:
+                self.stopping.wait(wait)
+            if self.writer.timeout() == 0:
+                self.writer.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="traquarium-ingestd", description=__doc__.split(": ", 1)[1])
+    parser.add_argument("--user", required=True, help="user whose readings are recorded")
+    parser.add_argument("--data-dir", default=".", help="folder holding the users folder (default: current)")
+    parser.add_argument("--engine", help="storage engine (default: the one the user already has)")
+    parser.add_argument("--spool", help="also ingest reading files dropped into this folder")
+    parser.add_argument("--no-stdin", action="store_true", help="do not read readings from stdin")
+    parser.add_argument("--batch-size", type=int, default=1000, help="readings per write (default: 1000)")
+    parser.add_argument("--max-delay", type=float, default=2.0,
+                        help="seconds a reading may wait before its batch is written (default: 2)")
+    args = parser.parse_args(argv)
+    if args.no_stdin and not args.spool:
+        parser.error("nothing to read: give --spool or drop --no-stdin")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.chdir(args.data_dir)
+    try:
+        writer = BatchWriter(args.user, args.engine, args.batch_size, args.max_delay,
+                             on_reject=lambda reading, message: log.warning("Rejected %r: %s", reading, message))
+    except UserLockedError as e:
+        log.error("%s", e)
+        return 1
+    daemon = IngestDaemon(writer, SpoolDirectory(args.spool) if args.spool else None, not args.no_stdin)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    log.info("Recording readings for %s in %s", args.user, writer.file_path)
+    daemon.run()
+    return 0
@@ -0,0 +1,28 @@
+"""Line protocol for readings sent to the ingest daemon"""
+
+import json
+
+FIELDS = ("name", "pH", "temperature", "ammonia", "timestamp")
+
+
+def parse_line(line):
+    """The reading dict encoded in one line of input, or None for a blank line.
+
+    A line is either a JSON object with name, pH, temperature, ammonia and
+    optionally timestamp ("YYYY-MM-DD HH:MM[:SS]"), or the same values
+    comma-separated in that order. Lines starting with # are comments.
+    Values are checked later, with the rest of the batch; only lines that
+    cannot be split into fields raise ValueError here.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith("{"):
+        reading = json.loads(line)
+        if not isinstance(reading, dict):
+            raise ValueError("Expected a JSON object")
+        return reading
+    values = [value.strip() for value in line.split(",")]
+    if len(values) not in (4, 5):
+        raise ValueError(f"Expected 4 or 5 comma-separated values, got {len(values)}")
+    return dict(zip(FIELDS, values))
@@ -0,0 +1,302 @@
+"""Local HTTP API for recording and reading back readings"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import re
+import signal
+import socketserver
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from data_model import ReadingManager
+from storage import UserLockedError
+from validation import ValidationHelper
+from .protocol import parse_line
+
+log = logging.getLogger("traquarium.httpd")
+
+MAX_BODY = 16 * 1024 * 1024
+PROFILE_PATH = re.compile(r"/profiles/([^/]+)/(latest|range)")
+
+
+class ReadingService:
+    """Thread-safe front of a ReadingManager for concurrent requests.
+
+    Reads are answered from the manager's in-memory indexes. Writes are
+    coalesced: submit() queues a request's readings and a single committer
+    thread adds everything queued since its last commit with one
+    add_readings() call, so many small POSTs cost one storage write while
+    the previous commit is in progress. With a write_behind manager the
+    lock only covers the in-memory update; the committer waits for the
+    storage write (manager.flush()) after releasing it, so reads are never
+    held up by the disk.
+    """
+
+    def __init__(self, manager, max_batch=10000):
+        self.manager = manager
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.commits = 0
+        self.committer = threading.Thread(target=self._commit_loop, name="committer", daemon=True)
+        self.committer.start()
+
+    def submit(self, readings):
+        """Queue readings for the next commit; a Future of (ids, rejects) for them."""
+        future = Future()
+        self.requests.put((list(readings), future))
+        return future
+
+    def _commit_loop(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            count = len(request[0])
+            stop = False
+            while count < self.max_batch:
+                try:
+                    request = self.requests.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+                count += len(request[0])
+            self._commit(batch)
+            if stop:
+                return
+
+    def _commit(self, batch):
+        readings = [reading for request, _ in batch for reading in request]
+        try:
+            with self.lock:
+                ids, rejects = self.manager.add_readings(readings)
+        except Exception as e:
+            if len(batch) > 1:
+                # Invalid readings are rejected, so this is a fault add_readings()
+                # hit before changing anything; commit each request alone so
+                # only the one that caused it gets the error
+                for request in batch:
+                    self._commit([request])
+                return
+            batch[0][1].set_exception(e)
+            return
+        try:
+            # Answer only once the readings are on disk
+            self.manager.flush(self.lock)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.commits += 1
+        # Split the combined result back into each request's share
+        rejected = dict(rejects)
+        ids = iter(ids)
+        offset = 0
+        for request, future in batch:
+            own_ids, own_rejects = [], []
+            for index in range(len(request)):
+                message = rejected.get(offset + index)
+                if message is None:
+                    own_ids.append(next(ids))
+                else:
+                    own_rejects.append((index, message))
+            offset += len(request)
+            future.set_result((own_ids, own_rejects))
+
+    def latest(self, name):
+        """The most recent reading dict of a profile, or None."""
+        with self.lock:
+            readings = self.manager.query(name, limit=1).to_dicts()
+        return readings[0] if readings else None
+
+    def range(self, name, start=None, end=None, limit=None):
+        """Reading dicts of a profile within [start, end] in time order."""
+        with self.lock:
+            return self.manager.query(name, start, end, limit).to_dicts()
+
+    def close(self):
+        """Commit what is queued, stop the committer and close the manager."""
+        self.requests.put(None)
+        self.committer.join()
+        self.manager.close()
+
+
+def parse_body(body, content_type):
+    """Reading dicts in a POST body: a JSON object or array, or NDJSON / CSV lines."""
+    text = body.decode("utf-8")
+    if content_type == "application/json":
+        data = json.loads(text)
+        readings = data if isinstance(data, list) else [data]
+    else:
+        readings = [reading for reading in map(parse_line, text.splitlines()) if reading is not None]
+    if not all(isinstance(reading, dict) for reading in readings):
+        raise ValueError("Expected JSON objects")
+    return readings
+
+
+def parse_time(value, field_name):
+    """A start/end query parameter: epoch seconds or a timestamp string, None if absent."""
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    valid, msg = ValidationHelper.validate_timestamp(value, field_name)
+    if not valid:
+        raise ValueError(msg)
+    return value
+
+
+class ReadingRequestHandler(BaseHTTPRequestHandler):
+    """POST /readings, GET /profiles/<name>/latest and GET /profiles/<name>/range."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "traquarium-httpd"
+    # Headers and body are separate writes; without this, Nagle's algorithm
+    # and delayed ACKs hold every response back by ~40 ms
+    disable_nagle_algorithm = True
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        log.debug("%s %s", self.address_string(), format % args)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": message})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != "/readings":
+            return self.send_error_json(404, "Not found")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            self.close_connection = True
+            return self.send_error_json(400, "Invalid Content-Length")
+        if length > MAX_BODY:
+            self.close_connection = True
+            return self.send_error_json(413, f"Body larger than {MAX_BODY} bytes")
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        try:
+            readings = parse_body(self.rfile.read(length), content_type)
+        except ValueError as e:
+            return self.send_error_json(400, f"Malformed body: {e}")
+        try:
+            ids, rejects = self.server.service.submit(readings).result()
+        except Exception as e:
+            log.error("Could not save readings: %s", e)
+            return self.send_error_json(500, f"Could not save readings: {e}")
+        self.send_json(201 if ids or not rejects else 422, {
+            "ids": ids, "rejected": [{"index": index, "error": message} for index, message in rejects]})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        match = PROFILE_PATH.fullmatch(url.path)
+        if not match:
+            return self.send_error_json(404, "Not found")
+        name, action = unquote(match.group(1)), match.group(2)
+        service = self.server.service
+        if action == "latest":
+            reading = service.latest(name)
+            if reading is None:
+                return self.send_error_json(404, f"No readings for {name}")
+            return self.send_json(200, reading)
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            limit = int(params["limit"]) if "limit" in params else None
+            if limit is not None and limit < 0:
+                raise ValueError("limit must not be negative")
+            start = parse_time(params.get("start"), "start")
+            end = parse_time(params.get("end"), "end")
+            readings = service.range(name, start, end, limit)
+        except ValueError as e:
+            return self.send_error_json(400, str(e))
+        self.send_json(200, {"readings": readings})
+
+
+class ReadingHTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 refuses bursts of clients connecting at once
+    request_queue_size = 128
+
+    def __init__(self, address, service):
+        super().__init__(address, ReadingRequestHandler)
+        self.service = service
+
+
+class UnixReadingRequestHandler(ReadingRequestHandler):
+    # TCP_NODELAY does not apply to (and fails on) Unix sockets
+    disable_nagle_algorithm = False
+
+
+class UnixReadingHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, path, service):
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, UnixReadingRequestHandler)
+        self.service = service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="traquarium-httpd", description=__doc__)
+    parser.add_argument("--user", required=True, help="user whose readings are served")
+    parser.add_argument("--data-dir", default=".", help="folder holding the users folder (default: current)")
+    parser.add_argument("--engine", help="storage engine (default: the one the user already has)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    parser.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    os.chdir(args.data_dir)
+    try:
+        lock = ReadingManager.lock_user(args.user)
+    except UserLockedError as e:
+        log.error("%s", e)
+        return 1
+    service = ReadingService(ReadingManager(args.user, args.engine, write_behind=True))
+    if args.socket:
+        server = UnixReadingHTTPServer(args.socket, service)
+        where = args.socket
+    else:
+        server = ReadingHTTPServer((args.host, args.port), service)
+        where = f"http://{args.host}:{server.server_address[1]}"
+
+    # shutdown() waits for serve_forever(), so it cannot run in the signal handler itself
+    def stop(*args):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    log.info("Serving %d readings of %s on %s", service.manager.totals().count, args.user, where)
+    server.serve_forever()
+    server.server_close()
+    service.close()
+    lock.release()
+    if args.socket:
+        os.remove(args.socket)
+    log.info("Stopped after %d commits", service.commits)
+    return 0
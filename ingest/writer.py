@@ -0,0 +1,103 @@
+"""Batched, bounded-latency writes of readings for one user"""
+
+import os
+import time
+from data_model import ReadingManager, validate_readings
+from storage.column_store import next_id
+
+
+class BatchWriter:
+    """Buffers readings for one user and appends them to storage in batches.
+
+    A batch is written once it holds batch_size readings or its oldest
+    reading has waited max_delay seconds, whichever comes first; each batch
+    is one append_many() call, so one fsynced journal line or one SQLite
+    transaction. Only the pending batch is kept in memory. The user's
+    history is loaded (into a throwaway ReadingManager) only when the
+    journal needs folding into the snapshot, so memory stays flat however
+    long the writer runs. The writer holds the user's lock (see
+    ReadingManager.lock_user) until close().
+
+    Every reading gets a new id, whatever id it came with: without the
+    history at hand the writer cannot tell whether an id is taken, and
+    loading skips appends that reuse one.
+    """
+
+    def __init__(self, username, engine=None, batch_size=1000, max_delay=2.0, on_reject=None):
+        if batch_size < 1 or max_delay < 0:
+            raise ValueError("batch_size must be at least 1 and max_delay not negative")
+        self.username = username
+        self.engine = engine
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.on_reject = on_reject
+        self.pending = []
+        self.oldest = None
+        self.written = 0
+        self.rejected = 0
+        self._last_id = 0
+        self.lock = ReadingManager.lock_user(username)
+        try:
+            self.file_path, self.storage = ReadingManager.open_storage(username, engine)
+        except Exception:
+            self.lock.release()
+            raise
+        if not os.path.exists(self.file_path):
+            # Engines are detected from their snapshot, so create it up front
+            self.compact()
+        elif hasattr(self.storage, "entries"):
+            # Count journal lines left by earlier runs towards compaction
+            for _ in self.storage.entries():
+                pass
+
+    def add(self, reading):
+        """Queue one reading dict; writes the batch if it is full."""
+        if not self.pending:
+            self.oldest = time.monotonic()
+        self.pending.append(reading)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def timeout(self):
+        """Seconds until the pending batch is due (None when nothing is pending)."""
+        if not self.pending:
+            return None
+        return max(self.oldest + self.max_delay - time.monotonic(), 0.0)
+
+    def flush(self):
+        """Validate and write the pending batch. Returns how many readings were written."""
+        batch, self.pending = self.pending, []
+        return self.write(batch)
+
+    def write(self, batch):
+        """Validate and write a list of readings as one batch, bypassing the buffer."""
+        records, rejects = validate_readings(batch)
+        self.rejected += len(rejects)
+        if self.on_reject:
+            for index, message in rejects:
+                self.on_reject(batch[index], message)
+        if not records:
+            return 0
+        for record in records:
+            self._last_id = record["id"] = next_id(self._last_id)
+        self.storage.append_many(records)
+        self.written += len(records)
+        if self.storage.needs_compaction():
+            self.compact()
+        return len(records)
+
+    def compact(self):
+        """Fold the journal into the snapshot, holding the history only meanwhile."""
+        manager = ReadingManager(self.username, self.engine)
+        manager.save_readings()
+        self.file_path, self.storage = manager.file_path, manager.storage
+
+    def close(self):
+        try:
+            if self.pending:
+                self.flush()
+            close = getattr(self.storage, "close", None)
+            if close:
+                close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,7 @@
+"""Headless reading ingestion daemon (traquarium-ingestd); see ingest.daemon"""
+
+import sys
+from ingest.daemon import main
+
+if __name__ == "__main__":
+    sys.exit(main())
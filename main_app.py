@@ -1,6 +1,7 @@
 """Main application window"""
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QStackedWidget, QMenuBar, QMessageBox, QApplication
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QStackedWidget, QMenuBar, QMessageBox, QApplication, QProgressDialog
+from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QIcon, QKeySequence, QAction
 from data_model import ReadingManager
 from ui.utils import find_logo_path
@@ -22,6 +23,7 @@ class MainWindow(QWidget):
 
         self.current_user = None
         self.manager = None
+        self.user_lock = None
         self.is_closing = False
 
         main_layout = QVBoxLayout(self)
@@ -124,7 +126,7 @@ class MainWindow(QWidget):
                 QMessageBox.StandardButton.No
             )
             
-            if reply == QMessageBox.StandardButton.Yes:
+            if reply == QMessageBox.StandardButton.Yes and self.save_all():
                 QApplication.instance().quit()
             else:
                 self.is_closing = False
@@ -142,18 +144,67 @@ class MainWindow(QWidget):
             QMessageBox.StandardButton.No
         )
         
-        if reply == QMessageBox.StandardButton.Yes:
+        if reply == QMessageBox.StandardButton.Yes and self.save_all():
             event.accept()
         else:
             event.ignore()
 
+    def save_all(self, title='Exit Traquarium', question='Close anyway?'):
+        """Wait for background writes and close the manager. False if the user chose to stay after an error."""
+        if not self.manager:
+            return True
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            self.manager.flush()
+        except Exception as e:
+            QApplication.restoreOverrideCursor()
+            reply = QMessageBox.warning(
+                self,
+                title,
+                f'Some changes could not be saved:\n{e}\n\n{question}',
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return False
+            QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            self.manager.close()
+        except Exception:
+            pass  # Already reported above, or the user has agreed to lose it
+        finally:
+            QApplication.restoreOverrideCursor()
+        return True
+
     def set_current_user(self, username):
+        if self.manager:
+            # Finish the previous user's writes before their files may be read again
+            if not self.save_all('Log In', 'Log in anyway?'):
+                # The failed changes stay queued for another try; the login page shows this
+                raise RuntimeError(f"{self.current_user}'s changes are not saved yet")
+            self.manager = None
+        if self.user_lock:
+            self.user_lock.release()
+            self.user_lock = None
+        # Refuses to open a user a daemon or another window is writing; the
+        # login page shows the error
+        self.user_lock = ReadingManager.lock_user(username)
         self.current_user = username
-        self.manager = ReadingManager(username)
+
+        # Only shows up if loading a large JSON history takes a while
+        progress = QProgressDialog("Loading readings...", None, 0, 100, self)
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(500)
+
+        def report(done, total):
+            progress.setValue(int(done * 100 / total) if total else 100)
+
+        self.manager = ReadingManager(username, progress=report, write_behind=True)
+        progress.close()
 
         self.home_page = HomePage(self.stacked_widget, self.manager, username)
         self.history_page = HistoryPage(self.stacked_widget, self.manager)
-        self.graph_page = GraphPage(self.stacked_widget)
+        self.graph_page = GraphPage(self.stacked_widget, self.manager)
         self.input_page = InputPage(self.stacked_widget, self.history_page, self.graph_page, self.manager)
 
         while self.stacked_widget.count() > 3:
@@ -165,8 +216,3 @@ class MainWindow(QWidget):
         self.stacked_widget.addWidget(self.input_page)
         self.stacked_widget.addWidget(self.history_page)
         self.stacked_widget.addWidget(self.graph_page)
-
-        readings = self.manager.get_all()
-        self.home_page.update_latest(readings)
-        self.history_page.update_table(readings)
-        self.graph_page.update_graph(readings)
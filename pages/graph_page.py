@@ -7,22 +7,57 @@ from PyQt6.QtWidgets import QLabel
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
 from ui.base_page import AquaPage
+from data_model import ReadingEvent
+from storage.decimate import minmax_decimate
 
 
 class GraphPage(AquaPage):
-    def __init__(self, stacked_widget):
+    # (field, colour, legend name) for each plotted parameter
+    SERIES = (("pH", "#06B6D4", "pH Level"),
+              ("temperature", "#F59E0B", "Temperature (°C)"),
+              ("ammonia", "#EF4444", "Ammonia (ppm)"))
+    # Profiles with more readings than this are drawn as decimated lines
+    BAR_LIMIT = 200
+    # Bar spacing used when a profile has a single reading (seconds)
+    DEFAULT_SPACING = 3600
+
+    def __init__(self, stacked_widget, manager=None):
         super().__init__("Water Parameter Graph", stacked_widget)
+        self.manager = manager
+        self.selected_name = None
 
-        # Graph area
-        self.plot_widget = pg.PlotWidget()
+        # Graph area; timestamps are wall-clock epoch seconds, so the date
+        # axis must not shift them by the local UTC offset
+        self.plot_widget = pg.PlotWidget(axisItems={"bottom": pg.DateAxisItem(orientation="bottom", utcOffset=0)})
         self.plot_widget.setBackground("#1D2429")
         self.plot_widget.setLabel("left", "Value", color="#FFFFFF")
-        self.plot_widget.setLabel("bottom", "Reading Index", color="#FFFFFF")
+        self.plot_widget.setLabel("bottom", "Time", color="#FFFFFF")
         self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
         self.plot_widget.setMouseEnabled(x=False, y=False)
-        self.plot_widget.addLegend(offset=(10, 10))
+        self.legend = self.plot_widget.addLegend(offset=(10, 10))
         self.content_layout.addWidget(self.plot_widget, stretch=1)
 
+        # Plot items are created once and updated in place with setOpts()/setData()
+        self.bars = []
+        self.lines = []
+        for field, color, name in self.SERIES:
+            bar = pg.BarGraphItem(x=[], height=[], width=1, brush=color)
+            line = pg.PlotDataItem(pen=pg.mkPen(color, width=1.5))
+            self.plot_widget.addItem(bar)
+            self.plot_widget.addItem(line)
+            self.bars.append(bar)
+            self.lines.append(line)
+        # Items currently shown and in the legend
+        self.shown = []
+
+        # Full-resolution series behind the line items, re-decimated on zoom/pan
+        self.line_x = None
+        self.line_columns = []
+        self.line_levels = []
+        view_box = self.plot_widget.getViewBox()
+        view_box.sigXRangeChanged.connect(self.redraw_lines)
+        view_box.sigResized.connect(self.redraw_lines)
+
         # Info box (centered below graph)
         self.info_box = QLabel("")
         self.info_box.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -31,42 +66,84 @@ class GraphPage(AquaPage):
         self.info_box.setStyleSheet(INFO_BOX_STYLE)
         self.content_layout.addWidget(self.info_box, alignment=Qt.AlignmentFlag.AlignCenter)
 
+        if self.manager:
+            self.manager.subscribe(self.on_readings_changed)
+        self.update_graph(None)
+
+    def show_profile(self, name):
+        """Select a profile and draw its readings from the manager."""
+        readings = self.manager.query(name) if name else None
+        self.update_graph(readings, selected_name=name)
+
+    def on_readings_changed(self, event):
+        """Redraw only when the change touches the displayed profile."""
+        if not self.selected_name:
+            return
+        if event.kind == ReadingEvent.RELOADED or self.selected_name.strip().lower() in event.names():
+            self.show_profile(self.selected_name)
+
     def update_graph(self, readings, selected_name=None):
-        """Draws a smooth line graph for one or all readings."""
-        self.plot_widget.clear()
+        """Draws bar graphs for the selected profile's readings.
+
+        readings is a ReadingView already filtered to selected_name. A
+        zoomed or panned line graph keeps its range when the same profile is
+        drawn again, unless it showed the newest readings: then it moves
+        along to the new ones.
+        """
+        same_profile = bool(selected_name and self.selected_name) and \
+            selected_name.strip().lower() == self.selected_name.strip().lower()
+        self.selected_name = selected_name
         
         if not selected_name:
+            self._show_items([])
             self.info_box.setText("No profile selected.")
             return
 
         if not readings:
-            self.info_box.setText("No readings to display.")
+            self._show_items([])
+            self.info_box.setText(f"No data found for '{selected_name}'.")
             return
 
-        # Filter by selected name
-        if selected_name:
-            readings = [r for r in readings if r["name"].lower() == selected_name.lower()]
-            if not readings:
-                self.info_box.setText(f"No data found for '{selected_name}'.")
-                return
-
-        # Plot data as bar graphs
-        x = np.arange(len(readings))
-        ph = np.array([float(r["pH"]) for r in readings])
-        temp = np.array([float(r["temperature"]) for r in readings])
-        ammonia = np.array([float(r["ammonia"]) for r in readings])
-        
-        # Bar width
-        bar_width = 0.25
-        
-        # Create bar graphs with offset positions
-        bg1 = pg.BarGraphItem(x=x - bar_width, height=ph, width=bar_width, brush="#06B6D4", name="pH Level")
-        bg2 = pg.BarGraphItem(x=x, height=temp, width=bar_width, brush="#F59E0B", name="Temperature (°C)")
-        bg3 = pg.BarGraphItem(x=x + bar_width, height=ammonia, width=bar_width, brush="#EF4444", name="Ammonia (ppm)")
-        
-        self.plot_widget.addItem(bg1)
-        self.plot_widget.addItem(bg2)
-        self.plot_widget.addItem(bg3)
+        x = readings.timestamps
+        columns = [readings.column(field) for field, _, _ in self.SERIES]
+        if np.any(x[1:] < x[:-1]):
+            # Edited timestamps can leave a profile out of time order
+            order = np.argsort(x, kind="stable")
+            x = x[order]
+            columns = [values[order] for values in columns]
+        x = x.astype(np.float64)
+
+        if len(readings) <= self.BAR_LIMIT:
+            # Three bars side by side per reading, sized to the typical gap
+            # between readings so irregular sampling stays readable
+            gaps = np.diff(x)
+            gaps = gaps[gaps > 0]
+            bar_width = (np.median(gaps) if len(gaps) else self.DEFAULT_SPACING) / 4
+            self.line_x = None
+            for line in self.lines:
+                line.setData([], [])
+            for k, (bar, values) in enumerate(zip(self.bars, columns)):
+                bar.setOpts(x=x + (k - 1) * bar_width, height=values, width=bar_width)
+            self._show_items(self.bars)
+            self.plot_widget.setMouseEnabled(x=False, y=False)
+            self.plot_widget.enableAutoRange()
+        else:
+            # Too many readings for bars: draw min/max-decimated lines that
+            # can be zoomed and panned along the time axis
+            previous = self.line_x if same_profile else None
+            x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+            self.line_x = None
+            self._show_items(self.lines)
+            self.plot_widget.setMouseEnabled(x=True, y=False)
+            if previous is None:
+                self.plot_widget.setXRange(x[0], x[-1], padding=0.02)
+            elif x_max >= previous[-1]:
+                self.plot_widget.setXRange(x_min, x_max + max(x[-1] - previous[-1], 0), padding=0)
+            self.plot_widget.enableAutoRange(axis="y")
+            self.line_x = x
+            self.line_columns = columns
+            self.line_levels = self._rollup_levels(readings)
+            self.redraw_lines()
 
         # Display info box for last reading
         latest = readings[-1]
@@ -80,6 +157,66 @@ class GraphPage(AquaPage):
         </div>
         """)
 
-        self.plot_widget.showGrid(x=True, y=True, alpha=0.3)
-        self.plot_widget.setBackground("#1D2429")
-        self.plot_widget.setMouseEnabled(x=False, y=False)
+    def _rollup_levels(self, readings):
+        """(rollup, bucket centre times) per pyramid level, finest first.
+
+        Rollups summarise the whole profile, so they are only used when
+        readings is the whole profile rather than a time range of it.
+        """
+        if not self.manager:
+            return []
+        levels = []
+        for rollup in self.manager.rollups(self.selected_name):
+            if rollup.counts.sum() != len(readings):
+                return []
+            levels.append((rollup, rollup.starts + rollup.width / 2))
+        return levels
+
+    def redraw_lines(self, *args):
+        """Draw the visible x range with at most about two points per pixel.
+
+        When more raw readings are on screen than that, the finest rollup
+        level with no more buckets than pixels is drawn as a min/max envelope,
+        so only the buckets in view are touched.
+        """
+        if self.line_x is None:
+            return
+        view_box = self.plot_widget.getViewBox()
+        x_min, x_max = view_box.viewRange()[0]
+        buckets = max(int(view_box.width()), 100)
+
+        level = None
+        lo, hi = np.searchsorted(self.line_x, [x_min, x_max])
+        if hi - lo > 2 * buckets:
+            for rollup, centres in self.line_levels:
+                first, last = np.searchsorted(centres, [x_min, x_max])
+                if last - first <= buckets:
+                    # One bucket either side so the lines reach the edges
+                    level = (rollup, centres, max(first - 1, 0), min(last + 1, len(centres)))
+                    break
+
+        for line, (field, _, _), values in zip(self.lines, self.SERIES, self.line_columns):
+            if level is None:
+                x, y = minmax_decimate(self.line_x, values, x_min, x_max, buckets)
+            else:
+                rollup, centres, first, last = level
+                x = np.repeat(centres[first:last], 2)
+                y = np.empty(len(x))
+                y[0::2] = rollup.minimum(field)[first:last]
+                y[1::2] = rollup.maximum(field)[first:last]
+            line.setData(x, y)
+
+    def _show_items(self, items):
+        """Show one set of plot items (bars or lines) and hide the rest.
+
+        The items and the legend only change when a different set is shown.
+        """
+        if items == self.shown:
+            return
+        self.shown = items
+        for item in self.bars + self.lines:
+            item.setVisible(item in items)
+        self.legend.clear()
+        for item, (_, _, name) in zip(items, self.SERIES):
+            self.legend.addItem(item, name)
+        self.legend.setVisible(bool(items))
@@ -1,16 +1,17 @@
 # pages/history_page.py
 """History page with table view and warnings"""
 
-import json
-from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, 
+from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, QPushButton, QTableView,
                               QTableWidget, QTableWidgetItem, QHeaderView, QFrame,
                               QAbstractItemView, QMessageBox, QStyledItemDelegate, QLineEdit)
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QFont, QColor, QDoubleValidator
+from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtGui import QFont, QDoubleValidator
 from ui.base_page import AquaPage
 from ui.components import ButtonFactory, InputFieldFactory, StrictDoubleValidator
 from ui.styles import TABLE_STYLE, TABLE_ALTERNATE_STYLE, TABLE_NO_SELECTION_STYLE, DROPDOWN_FRAME_STYLE
 from ui.helpers import DataHelper, WarningHelper, DialogHelper
+from ui.models import ReadingTableModel, ReadingFilterModel
+from data_model import ReadingEvent
 
 
 class NumericDelegate(QStyledItemDelegate):
@@ -101,6 +102,15 @@ class NumericDelegate(QStyledItemDelegate):
 
 
 class HistoryPage(AquaPage):
+    # Wait this long after the last keystroke before filtering
+    SEARCH_DELAY_MS = 150
+
+    EDIT_RANGES = {
+        "pH": (0, 14, "pH must be between 0 and 14!\n\nRefer to Water Parameter Guide:\npH Level (6.5 - 8.0) is ideal for most aquariums."),
+        "temperature": (0, 40, "Temperature must be between 0°C and 40°C!\n\nRefer to Water Parameter Guide:\nTemperature (20-28°C / 68-82°F) is ideal for most fish."),
+        "ammonia": (0, 10, "Ammonia must be between 0 and 10 ppm!\n\nRefer to Water Parameter Guide:\nAmmonia (0-0.5 ppm) is the safe range."),
+    }
+
     def __init__(self, stacked_widget, manager):
         super().__init__("History", stacked_widget)
         self.stacked_widget = stacked_widget
@@ -114,7 +124,11 @@ class HistoryPage(AquaPage):
         
         self.search_input = InputFieldFactory.create_search_input("Search by profile name...", QFont("Segoe UI", 11))
         self.search_input.setFixedWidth(250)
-        self.search_input.textChanged.connect(self.live_search)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.live_search)
+        self.search_input.textChanged.connect(lambda _: self.search_timer.start())
 
         search_button = ButtonFactory.create_nav_button("Search", QFont("Segoe UI", 10, QFont.Weight.Bold))
         search_button.setFixedWidth(90)
@@ -145,13 +159,17 @@ class HistoryPage(AquaPage):
         top_layout.addWidget(delete_button)
         top_layout.addWidget(refresh_button)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Timestamp", "Name", "pH", "Temperature (°C)", "Ammonia (ppm)"])
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        # Virtual table: the model formats only the cells that are on screen,
+        # and the search box filters it through a proxy
+        self.table_model = ReadingTableModel(self.manager.store, self)
+        self.table_filter = ReadingFilterModel(self)
+        self.table_filter.setSourceModel(self.table_model)
+        self.table = QTableView()
+        self.table.setModel(self.table_filter)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        self.table.cellClicked.connect(self.on_table_cell_clicked)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.clicked.connect(lambda index: self.on_table_cell_clicked(index.row(), index.column()))
         self.table.verticalHeader().sectionClicked.connect(self.on_row_header_clicked)
         
         # Set minimum row height to prevent header cutoff
@@ -244,43 +262,64 @@ class HistoryPage(AquaPage):
         self.content_layout.addWidget(self.dropdown_button)
         self.content_layout.addWidget(self.dropdown_frame)
 
-        self.update_table(self.manager.get_all())
+        # Filled when the page is first shown, so logging in does not have to
+        # read every reading (see ReadingManager.load_readings)
+        self.table_filled = False
+        self.manager.subscribe(self.on_readings_changed)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.table_filled:
+            self.table_filled = True
+            self.update_table(self.manager.view())
 
     def _field(self, reading, attr, alt_keys):
         return DataHelper.get_field(reading, attr, alt_keys)
 
     def update_table(self, readings):
-        self.table.setRowCount(len(readings))
+        # Resetting a long model while scrolled far down makes Qt walk every
+        # row it scrolls back past, so jump to the top first
+        self.table.scrollToTop()
+        self.table_model.set_view(readings)
 
-        for row, reading in enumerate(readings):
-            ts = self._field(reading, "timestamp", ["timestamp"])
-            name = self._field(reading, "name", ["name"])
-            ph = self._field(reading, "pH", ["pH"])
-            temp = self._field(reading, "temperature", ["temperature"])
-            ammonia = self._field(reading, "ammonia", ["ammonia"])
+    def _source_row(self, row):
+        """Map a row of the (filtered) table to a row of the table model."""
+        return self.table_filter.source_row(row)
 
-            ph_text = DataHelper.format_float(ph, 2)
-            temp_text = DataHelper.format_float(temp, 1)
-            ammonia_text = DataHelper.format_float(ammonia, 2)
+    def on_readings_changed(self, event):
+        """Apply a change event to the table model row by row instead of rebuilding it.
 
-            items = [
-                QTableWidgetItem(str(ts)),
-                QTableWidgetItem(str(name)),
-                QTableWidgetItem(ph_text),
-                QTableWidgetItem(temp_text),
-                QTableWidgetItem(ammonia_text)
-            ]
-            for col, it in enumerate(items):
-                it.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                self.table.setItem(row, col, it)
+        The filter proxy decides which of the changed rows are shown.
+        """
+        if not self.table_filled:
+            return
+        model = self.table_model
+        if event.kind == ReadingEvent.RELOADED:
+            self.update_table(self.manager.view())
+        elif event.kind == ReadingEvent.ADDED:
+            model.append_ids([r["id"] for r in event.rows])
+        elif event.kind == ReadingEvent.UPDATED:
+            for reading in event.rows:
+                row = model.row_of(reading["id"])
+                if row >= 0:
+                    model.refresh_row(row)
+        elif event.kind == ReadingEvent.DELETED:
+            for reading in event.rows:
+                row = model.row_of(reading["id"])
+                if row >= 0:
+                    model.remove_row(row)
+
+        if self.selected_name and self.dropdown_frame.isVisible():
+            if event.kind == ReadingEvent.RELOADED or self.selected_name.lower() in event.names():
+                self.update_dropdown_tables()
 
     def on_table_cell_clicked(self, row, column):
         """When a row is clicked, select it and update graph instantly."""
-        item = self.table.item(row, 1)
-        if not item:
+        name = self.table_model.value(self._source_row(row), "name")
+        if not name:
             return
 
-        self.selected_name = item.text().strip()
+        self.selected_name = name.strip()
         self.table.selectRow(row)
 
         if self.dropdown_frame.isVisible():
@@ -288,8 +327,7 @@ class HistoryPage(AquaPage):
 
         parent = self.parentWidget().parentWidget()
         if hasattr(parent, "graph_page"):
-            readings = self.manager.get_all()
-            parent.graph_page.update_graph(readings, selected_name=self.selected_name)
+            parent.graph_page.show_profile(self.selected_name)
 
     def on_row_header_clicked(self, logicalIndex):
         self.table.selectRow(logicalIndex)
@@ -308,10 +346,7 @@ class HistoryPage(AquaPage):
             self.warning_table.setRowCount(0)
             return
 
-        all_readings = self.manager.get_all()
-        matches = [r for r in all_readings
-                   if str(self._field(r, "name", ["name"])).strip().lower() == self.selected_name.lower()]
-        matches = matches[-2:]
+        matches = self.manager.query(self.selected_name, limit=2)
 
         if not matches:
             self.saved_table.setRowCount(1)
@@ -356,25 +391,24 @@ class HistoryPage(AquaPage):
         return WarningHelper.generate_warnings(ph, temp, ammonia)
 
     def live_search(self):
-        search_name = self.search_input.text().strip().lower()
-        all_readings = self.manager.get_all()
-        if not search_name:
-            self.update_table(all_readings)
-            return
-        filtered = [r for r in all_readings if str(self._field(r, "name", ["name"])).strip().lower().startswith(search_name)]
-        self.update_table(filtered)
+        self.search_timer.stop()
+        self.table.scrollToTop()
+        self.table_filter.set_prefix(self.search_input.text())
 
     def refresh_table(self):
         # Cancel edit mode if active
         if self.is_editing:
             self.cancel_edit_mode()
         
+        self.search_input.blockSignals(True)
         self.search_input.clear()
+        self.search_input.blockSignals(False)
+        self.search_timer.stop()
+        self.table_filter.set_prefix("")
         self.selected_name = None
         self.dropdown_frame.setVisible(False)
         self.dropdown_button.setChecked(False)
-        self.manager.load_readings()  # Reload from file
-        self.update_table(self.manager.get_all())
+        self.manager.load_readings()  # Reload from file; the RELOADED event rebuilds the table
         
         parent = self.parentWidget().parentWidget()
         if hasattr(parent, "graph_page"):
@@ -388,8 +422,8 @@ class HistoryPage(AquaPage):
             self.start_edit_mode()
     
     def start_edit_mode(self):
-        """Enable editing for selected row"""
-        row = self.table.currentRow()
+        """Enable editing, starting from the selected row"""
+        row = self.table.currentIndex().row()
         if row == -1:
             QMessageBox.warning(self, "No Selection", "Please select a row to edit.")
             return
@@ -405,44 +439,26 @@ class HistoryPage(AquaPage):
         # Show save button
         self.save_button.setVisible(True)
         
-        # Enable editing on the table
-        self.table.setEditTriggers(QTableWidget.EditTrigger.DoubleClicked | QTableWidget.EditTrigger.SelectedClicked)
-        
-        # Make timestamp column non-editable, others editable
-        for col in range(5):
-            item = self.table.item(row, col)
-            if item:
-                if col == 0:  # Timestamp - not editable
-                    item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                else:  # Name, pH, Temperature, Ammonia - editable
-                    item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-        
-        # Highlight the row
-        for col in range(5):
-            item = self.table.item(row, col)
-            if item:
-                item.setBackground(QColor("#4A5F7F"))
+        # Enable editing on the table and highlight the selected row
+        # (timestamps are never editable)
+        self.table_model.set_editable(True, highlight_row=self._source_row(row))
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.SelectedClicked)
         
         QMessageBox.information(self, "Edit Mode", 
             "Edit mode enabled!\n\n"
             "• Double-click on Name, pH, Temperature, or Ammonia to edit\n"
+            "• You can change several readings before saving\n"
             "• Only numbers allowed for pH, Temperature, Ammonia\n"
             "• Click 'Save' when done or 'Cancel' to discard changes")
     
     def cancel_edit_mode(self):
-        """Cancel edit mode and reload original data"""
-        if self.edited_row >= 0:
-            # Remove highlight
-            for col in range(5):
-                item = self.table.item(self.edited_row, col)
-                if item:
-                    item.setBackground(QColor(0, 0, 0, 0))  # Transparent
-        
+        """Leave edit mode, discarding any pending edits"""
         self.is_editing = False
         self.edited_row = -1
         
-        # Disable editing on the table
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        # Disable editing on the table; the model drops its pending edits
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_model.set_editable(False)
         
         # Reset button
         self.edit_button.setText("Edit")
@@ -451,89 +467,59 @@ class HistoryPage(AquaPage):
         
         # Hide save button
         self.save_button.setVisible(False)
-        
-        # Reload original data
-        self.update_table(self.manager.get_all())
-    
+
     def save_edited_row(self):
-        """Validate and save the edited row"""
-        if not self.is_editing or self.edited_row < 0:
+        """Validate the pending edits and commit them in one transaction"""
+        if not self.is_editing:
             return
-        
-        row = self.edited_row
-        
-        try:
-            # Get values
-            name = self.table.item(row, 1).text().strip()
-            ph_text = self.table.item(row, 2).text().strip()
-            temp_text = self.table.item(row, 3).text().strip()
-            ammonia_text = self.table.item(row, 4).text().strip()
-            
-            # Validate name
-            if not name:
-                QMessageBox.warning(self, "Invalid Input", "Name cannot be empty!")
-                return
-            
-            # Validate and convert numbers
-            try:
-                ph = float(ph_text)
-                temp = float(temp_text)
-                ammonia = float(ammonia_text)
-            except ValueError:
-                QMessageBox.warning(self, "Invalid Input", 
-                    "pH, Temperature, and Ammonia must be valid numbers!")
-                return
-            
-            # Validate ranges (same as input page and water parameter guide)
-            if ph < 0 or ph > 14:
-                QMessageBox.warning(self, "Invalid Range", 
-                    "pH must be between 0 and 14!\n\nRefer to Water Parameter Guide:\npH Level (6.5 - 8.0) is ideal for most aquariums.")
-                return
-            
-            if temp < 0 or temp > 40:
-                QMessageBox.warning(self, "Invalid Range", 
-                    "Temperature must be between 0°C and 40°C!\n\nRefer to Water Parameter Guide:\nTemperature (20-28°C / 68-82°F) is ideal for most fish.")
-                return
-            
-            if ammonia < 0 or ammonia > 10:
-                QMessageBox.warning(self, "Invalid Range", 
-                    "Ammonia must be between 0 and 10 ppm!\n\nRefer to Water Parameter Guide:\nAmmonia (0-0.5 ppm) is the safe range.")
-                return
-            
-            # Save to file
-            data = []
-            for r in range(self.table.rowCount()):
-                data.append({
-                    "timestamp": self.table.item(r, 0).text(),
-                    "name": self.table.item(r, 1).text(),
-                    "pH": float(self.table.item(r, 2).text()),
-                    "temperature": float(self.table.item(r, 3).text()),
-                    "ammonia": float(self.table.item(r, 4).text())
-                })
-            
-            with open(self.manager.file_path, "w") as f:
-                json.dump(data, f, indent=4)
-            
-            self.manager.load_readings()
-            
-            # Update all pages
-            parent = self.parentWidget().parentWidget()
-            if hasattr(parent, "home_page"):
-                parent.home_page.update_latest(self.manager.get_all())
-            if hasattr(parent, "graph_page"):
-                parent.graph_page.update_graph(self.manager.get_all())
-            
-            QMessageBox.information(self, "Success", "Changes saved successfully!")
-            
-            # Exit edit mode
+
+        pending_edits = self.table_model.pending_edits
+        if not pending_edits:
+            QMessageBox.information(self, "No Changes", "There are no changes to save.")
             self.cancel_edit_mode()
-            
+            return
+
+        patches = {}
+        for reading_id, fields in pending_edits.items():
+            patch = {}
+            for field, text in fields.items():
+                if field == "name":
+                    if not text:
+                        QMessageBox.warning(self, "Invalid Input", "Name cannot be empty!")
+                        return
+                    patch[field] = text
+                    continue
+
+                try:
+                    value = float(text)
+                except ValueError:
+                    QMessageBox.warning(self, "Invalid Input", 
+                        "pH, Temperature, and Ammonia must be valid numbers!")
+                    return
+
+                # Validate ranges (same as input page and water parameter guide)
+                low, high, message = self.EDIT_RANGES[field]
+                if value < low or value > high:
+                    QMessageBox.warning(self, "Invalid Range", message)
+                    return
+                patch[field] = value
+            patches[reading_id] = patch
+
+        try:
+            self.manager.update_many(patches)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to save: {str(e)}")
+            return
+
+        # The UPDATED event has already refreshed the edited rows and other pages
+        self.cancel_edit_mode()
+
+        count = len(patches)
+        QMessageBox.information(self, "Success", f"Changes to {count} reading{'s' if count != 1 else ''} saved successfully!")
 
     def delete_button(self):
-        """Delete the selected row and update JSON."""
-        row = self.table.currentRow()
+        """Delete the selected reading by its id."""
+        row = self.table.currentIndex().row()
         if row == -1:
             QMessageBox.warning(self, "No Selection", "Please select a row to delete.")
             return
@@ -546,21 +532,7 @@ class HistoryPage(AquaPage):
         if confirm != QMessageBox.StandardButton.Yes:
             return
 
-        timestamp_to_delete = self.table.item(row, 0).text()
-
-        readings = self.manager.get_all()
-        updated = [r for r in readings if r["timestamp"] != timestamp_to_delete]
-
-        with open(self.manager.file_path, "w") as f:
-            json.dump(updated, f, indent=4)
-
-        self.manager.load_readings()
-        self.update_table(self.manager.get_all())
-
-        parent = self.parentWidget().parentWidget()
-        if hasattr(parent, "home_page"):
-            parent.home_page.update_latest(self.manager.get_all())
-        if hasattr(parent, "graph_page"):
-            parent.graph_page.update_graph(self.manager.get_all())
+        # Subscribed pages, this table included, apply the DELETED event
+        self.manager.delete(self.table_model.reading_id(self._source_row(row)))
 
         QMessageBox.information(self, "Deleted", "Reading deleted successfully!")
@@ -13,9 +13,8 @@ from PyQt6.QtWidgets import (
 )
 from PyQt6.QtCore import Qt, QPointF, QRectF
 from PyQt6.QtGui import QFont, QPixmap, QPainter, QLinearGradient, QColor, QPainterPath
-from datetime import datetime
+from datetime import datetime, timezone
 import pyqtgraph as pg
-import numpy as np
 
 
 class HomePage(QWidget):
@@ -24,7 +23,7 @@ class HomePage(QWidget):
         self.username = username
         self.manager = manager
         self.stacked_widget = stacked_widget
-        self.readings = []
+        self.latest = None
 
         # Main horizontal layout (sidebar + content)
         main_layout = QHBoxLayout(self)
@@ -140,6 +139,14 @@ class HomePage(QWidget):
         self.plot_widget.getAxis('bottom').setStyle(tickTextOffset=10)
         self.plot_widget.getAxis('bottom').setPen(color=(184, 184, 184))
         self.plot_widget.getAxis('left').setPen(color=(184, 184, 184))
+
+        # One bar item for the three parameters, updated in place with setOpts()
+        self.latest_bars = pg.BarGraphItem(
+            x=[0, 1, 2], height=[0, 0, 0], width=0.6,
+            brushes=[(126, 135, 225), (239, 83, 80), (38, 198, 218)],
+        )
+        self.latest_bars.setVisible(False)
+        self.plot_widget.addItem(self.latest_bars)
         graph_layout.addWidget(self.plot_widget)
         
         content_layout.addWidget(self.graph_card)
@@ -165,7 +172,12 @@ class HomePage(QWidget):
 
         main_layout.addWidget(content_area, 1)
 
-        self.update_latest(self.manager.get_all())
+        self.update_latest()
+        self.manager.subscribe(self.on_readings_changed)
+
+    def on_readings_changed(self, event):
+        """Refresh the dashboard after any change to the readings."""
+        self.update_latest()
 
     def create_sidebar(self):
         """Create the left sidebar with user info and navigation"""
@@ -476,12 +488,17 @@ class HomePage(QWidget):
 
         return card
 
-    def update_latest(self, readings):
-        """Update display with the latest saved reading and stats."""
-        self.readings = readings
+    def update_latest(self):
+        """Update display with the latest saved reading and stats.
+
+        Counts, time span and averages come from the manager's running
+        totals, so a refresh does not scan the readings.
+        """
+        totals = self.manager.totals()
+        self.latest = self.manager.latest()
         
-        if not readings:
-            self.plot_widget.clear()
+        if self.latest is None:
+            self.latest_bars.setVisible(False)
             # Update summary with no data
             self.total_readings_label.setText("0\nTotal Readings")
             self.profiles_label.setText("0\nProfiles Tracked")
@@ -492,18 +509,14 @@ class HomePage(QWidget):
             return
 
         # Update summary stats
-        total = len(readings)
-        unique_profiles = len(set(r["name"] for r in readings))
+        total = totals.count
+        unique_profiles = self.manager.profile_count()
         
         self.total_readings_label.setText(f"{total}\nTotal Readings")
         self.profiles_label.setText(f"{unique_profiles}\nProfiles Tracked")
         
         # Format last updated time
-        latest = readings[-1]
-        try:
-            last_time = datetime.strptime(latest["timestamp"], "%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            last_time = datetime.strptime(latest["timestamp"], "%Y-%m-%d %H:%M")
+        last_time = datetime.fromtimestamp(totals.last, tz=timezone.utc)
         
         time_str = last_time.strftime("%b %d, %I:%M %p")
         self.last_updated_label.setText(f"{time_str}\nLast Updated")
@@ -513,45 +526,26 @@ class HomePage(QWidget):
         self.add_btn.setText("→ Go to Input")
 
         # Update graph with latest reading only
-        ph = float(latest["pH"])
-        temp = float(latest["temperature"])
-        ammonia = float(latest["ammonia"])
+        ph = float(self.latest["pH"])
+        temp = float(self.latest["temperature"])
+        ammonia = float(self.latest["ammonia"])
         
-        # Clear and create bar graph
-        self.plot_widget.clear()
-        
-        x = np.array([0, 1, 2])
-        heights = np.array([ph, temp, ammonia])
-        colors = [(126, 135, 225), (239, 83, 80), (38, 198, 218)]
-        
-        # Create bars
-        for i in range(3):
-            bar = pg.BarGraphItem(x=[x[i]], height=[heights[i]], width=0.6, brush=colors[i])
-            self.plot_widget.addItem(bar)
+        self.latest_bars.setOpts(height=[ph, temp, ammonia])
+        self.latest_bars.setVisible(True)
 
         # Update stats cards
-        if total > 1:
-            try:
-                first_date = datetime.strptime(readings[0]["timestamp"], "%Y-%m-%d %H:%M:%S")
-                last_date = datetime.strptime(readings[-1]["timestamp"], "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                first_date = datetime.strptime(readings[0]["timestamp"], "%Y-%m-%d %H:%M")
-                last_date = datetime.strptime(readings[-1]["timestamp"], "%Y-%m-%d %H:%M")
-            days = (last_date - first_date).days + 1
-        else:
-            days = 1
-
-        avg_ph = sum(float(r["pH"]) for r in readings) / total
-        avg_temp = sum(float(r["temperature"]) for r in readings) / total
+        days = (totals.last - totals.first) // 86400 + 1
+        avg_ph = totals.mean("pH")
+        avg_temp = totals.mean("temperature")
 
         self.update_stats(total, days, avg_ph, avg_temp)
 
     def update_stats(self, total, days, avg_ph, avg_temp):
         """Update statistics cards with latest reading data"""
-        if not self.readings:
+        if self.latest is None:
             return
             
-        latest = self.readings[-1]
+        latest = self.latest
         
         # Update pH card
         ph_val = latest["pH"]
@@ -145,9 +145,7 @@ class InputPage(AquaPage):
             return
         
         # Check for duplicate profile name
-        existing_readings = self.manager.get_all()
-        existing_names = [r["name"].lower() for r in existing_readings]
-        if name.lower() in existing_names:
+        if self.manager.has_profile(name):
             self.feedback.setText("Profile name already exists. Please use a different name.")
             self.feedback.setStyleSheet("color: #EF5350; font-weight: 500;")
             return
@@ -188,18 +186,9 @@ class InputPage(AquaPage):
             return
 
         reading = WaterReading(name, ph, temp, ammonia)
+        # Subscribed pages (home, history, graph) update themselves from the change event
         self.manager.add_reading(reading)
-
-        self.manager.load_readings()
-        readings = self.manager.get_all()
-
-        # Update linked pages
-        self.history_page.update_table(readings)
-        self.graph_page.update_graph(readings, selected_name=name)
-
-        # Update Home Dashboard
-        if hasattr(self.parentWidget().parentWidget(), "home_page"):
-            self.parentWidget().parentWidget().home_page.update_latest(readings)
+        self.graph_page.show_profile(name)
 
         # Clear inputs
         self.name_input.clear()
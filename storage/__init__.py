@@ -0,0 +1,16 @@
+"""Storage package"""
+
+from .journal import JournalStorage
+from .sqlite_storage import SQLiteStorage
+from .column_store import ReadingStore, ReadingView
+from .segments import SegmentStorage
+from .records import RecordStorage
+from .partitions import PartitionedStorage
+from .shards import ShardedStorage
+from .decimate import minmax_decimate
+from .pyramid import Rollup, RollupPyramid
+from .time_index import TimeIndex
+from .aggregates import RunningTotals, ReadingAggregates
+from .write_behind import WriteBehindStorage
+from .migrate import migrate_user, migrate_users
+from .lock import UserLock, UserLockedError
@@ -0,0 +1,192 @@
+"""Running aggregates over the readings in a ReadingStore"""
+
+import math
+import numpy as np
+from .column_store import FIELDS
+
+
+class RunningTotals:
+    """Count, time span and per-field sum / sum of squares of a set of readings.
+
+    add() and remove() are O(1). Removing the first or last reading leaves
+    the time span unknown until the owner recomputes it (bounds_stale).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sums = dict.fromkeys(FIELDS, 0.0)
+        self.squares = dict.fromkeys(FIELDS, 0.0)
+        self.first = None
+        self.last = None
+        self.bounds_stale = False
+
+    def add(self, timestamp, values):
+        self.count += 1
+        for f in FIELDS:
+            value = float(values[f])
+            self.sums[f] += value
+            self.squares[f] += value * value
+        if not self.bounds_stale:
+            self.first = timestamp if self.first is None else min(self.first, timestamp)
+            self.last = timestamp if self.last is None else max(self.last, timestamp)
+
+    def add_many(self, timestamps, values):
+        """add() for arrays of timestamps and {field: array} values."""
+        if not len(timestamps):
+            return
+        self.count += len(timestamps)
+        for f in FIELDS:
+            column = np.asarray(values[f], dtype=np.float64)
+            self.sums[f] += float(column.sum())
+            self.squares[f] += float(column @ column)
+        if not self.bounds_stale:
+            first, last = int(timestamps.min()), int(timestamps.max())
+            self.first = first if self.first is None else min(self.first, first)
+            self.last = last if self.last is None else max(self.last, last)
+
+    def remove(self, timestamp, values):
+        self.count -= 1
+        for f in FIELDS:
+            value = float(values[f])
+            self.sums[f] -= value
+            self.squares[f] -= value * value
+        if not self.count:
+            self.__init__()
+        elif timestamp in (self.first, self.last):
+            self.bounds_stale = True
+
+    def mean(self, field):
+        return self.sums[field] / self.count if self.count else None
+
+    def std(self, field):
+        """Population standard deviation of field."""
+        if not self.count:
+            return None
+        mean = self.sums[field] / self.count
+        return math.sqrt(max(self.squares[field] / self.count - mean * mean, 0.0))
+
+
+class ReadingAggregates:
+    """Running totals over all readings and per profile (lower-cased name).
+
+    The owner calls add()/remove() for every change, so the dashboard can
+    read counts, spans and means without touching the reading columns.
+    After a bulk load the owner calls invalidate(); everything is then
+    recomputed with vectorized passes the first time it is read, so a store
+    that is never summarised (such as a memory-mapped one) is not scanned.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.overall = RunningTotals()
+        self.profiles = {}
+        self.stale = False
+
+    @staticmethod
+    def key(name):
+        return name.strip().lower()
+
+    def invalidate(self):
+        """Forget the totals; the next read rebuilds them from the store."""
+        self.overall = RunningTotals()
+        self.profiles = {}
+        self.stale = True
+
+    def add(self, name, timestamp, values):
+        if self.stale:
+            return
+        timestamp = int(timestamp)
+        self.overall.add(timestamp, values)
+        self.profiles.setdefault(self.key(name), RunningTotals()).add(timestamp, values)
+
+    def add_rows(self, rows):
+        """add() for a batch of store rows."""
+        if self.stale:
+            return
+        store = self.store
+        rows = np.asarray(rows, dtype=np.intp)
+        codes, timestamps = store.codes[rows], store.timestamps[rows]
+        values = {f: store.column(f)[rows] for f in FIELDS}
+        self.overall.add_many(timestamps, values)
+        for code in np.unique(codes).tolist():
+            mask = codes == code
+            totals = self.profiles.setdefault(self.key(store.names[code]), RunningTotals())
+            totals.add_many(timestamps[mask], {f: values[f][mask] for f in FIELDS})
+
+    def remove(self, name, timestamp, values):
+        if self.stale:
+            return
+        timestamp = int(timestamp)
+        self.overall.remove(timestamp, values)
+        key = self.key(name)
+        totals = self.profiles.get(key)
+        if totals is not None:
+            totals.remove(timestamp, values)
+            if not totals.count:
+                del self.profiles[key]
+
+    @property
+    def count(self):
+        if self.stale:
+            self.rebuild()
+        return self.overall.count
+
+    @property
+    def profile_count(self):
+        if self.stale:
+            self.rebuild()
+        return len(self.profiles)
+
+    def totals(self, name=None):
+        """RunningTotals for one profile (all readings when name is None)."""
+        if self.stale:
+            self.rebuild()
+        totals = self.overall if name is None else self.profiles.get(self.key(name))
+        if totals is None:
+            return RunningTotals()
+        if totals.bounds_stale:
+            self._refresh_bounds(name, totals)
+        return totals
+
+    def _refresh_bounds(self, name, totals):
+        store = self.store
+        mask = store.alive
+        if name is not None:
+            mask = mask & np.isin(store.codes, store.codes_matching(name))
+        timestamps = store.timestamps[mask]
+        totals.first = int(timestamps.min())
+        totals.last = int(timestamps.max())
+        totals.bounds_stale = False
+
+    def rebuild(self):
+        store = self.store
+        self.overall = RunningTotals()
+        self.profiles = {}
+        self.stale = False
+        rows = store.live_indices()
+        if not len(rows):
+            return
+        codes = store.codes[rows]
+        timestamps = store.timestamps[rows]
+        size = len(store.names)
+        counts = np.bincount(codes, minlength=size)
+        sums = {f: np.bincount(codes, weights=store.column(f)[rows], minlength=size) for f in FIELDS}
+        squares = {f: np.bincount(codes, weights=store.column(f)[rows] ** 2, minlength=size) for f in FIELDS}
+        firsts = np.full(size, np.iinfo(np.int64).max)
+        lasts = np.full(size, np.iinfo(np.int64).min)
+        np.minimum.at(firsts, codes, timestamps)
+        np.maximum.at(lasts, codes, timestamps)
+
+        def totals_for(key_codes):
+            totals = RunningTotals()
+            totals.count = int(counts[key_codes].sum())
+            totals.sums = {f: float(sums[f][key_codes].sum()) for f in FIELDS}
+            totals.squares = {f: float(squares[f][key_codes].sum()) for f in FIELDS}
+            totals.first = int(firsts[key_codes].min())
+            totals.last = int(lasts[key_codes].max())
+            return totals
+
+        self.overall = totals_for(slice(None))
+        for key, key_codes in store.profiles().items():
+            if counts[key_codes].sum():
+                self.profiles[key] = totals_for(key_codes)
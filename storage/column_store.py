@@ -0,0 +1,488 @@
+"""Columnar in-memory reading store backed by NumPy arrays"""
+
+import time
+from bisect import bisect_left, insort
+import numpy as np
+
+FIELDS = ("pH", "temperature", "ammonia")
+
+
+def parse_timestamps(values):
+    """Convert "YYYY-MM-DD HH:MM[:SS]" strings to int64 wall-clock epoch seconds.
+
+    Timestamps are naive local times, so they are stored as if they were UTC;
+    format_timestamps() turns them back into the exact same strings.
+    """
+    arr = np.asarray(values, dtype="U19")
+    return np.asarray(arr, dtype="datetime64[s]").astype(np.int64)
+
+
+def format_timestamps(epochs):
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if not len(epochs):
+        return np.array([], dtype="U19")
+    dt = epochs.astype("datetime64[s]")
+    text = np.where(epochs % 60 == 0,
+                    np.datetime_as_string(dt, unit="m"),
+                    np.datetime_as_string(dt, unit="s"))
+    return np.char.replace(text.astype("U19"), "T", " ")
+
+
+def parse_timestamp(value):
+    return int(parse_timestamps([value])[0])
+
+
+def format_timestamp(epoch):
+    return str(format_timestamps([epoch])[0])
+
+
+def to_epoch(value):
+    """Epoch seconds for either an epoch number or a timestamp string."""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return parse_timestamp(value)
+
+
+def next_id(last_id):
+    """A new reading id: the current time in microseconds, above last_id.
+
+    Time-based ids stay unique across processes sharing a data folder;
+    last_id keeps them strictly increasing within one process.
+    """
+    return max(time.time_ns() // 1000, last_id + 1)
+
+
+def _all_unique(ids):
+    # Saved ids are almost always ascending, which skips the sort
+    if not (ids[1:] > ids[:-1]).all():
+        ids = np.sort(ids)
+    return bool((ids[1:] != ids[:-1]).all())
+
+
+class ReadingStore:
+    """Struct-of-arrays storage for readings.
+
+    Each parameter is a float64 column, timestamps are int64 epoch seconds and
+    profile names are dictionary-encoded into an int32 code column. Columns
+    grow by doubling, and the properties return views over the filled part.
+
+    Every row carries a stable int64 id. positions maps id -> row so update()
+    and delete() are O(1); deleted rows are only flagged in the alive column
+    and physically dropped once they make up half of the store. The map is
+    built lazily, so a store that is only read never pays for it.
+
+    attach() adopts existing arrays (such as views of a memory-mapped file)
+    as the columns without copying; they are copied into arrays the store
+    owns the first time it has to grow.
+
+    Lowercased profile names are also kept in a sorted list, so prefix
+    lookups are a bisect instead of a scan over every name.
+    """
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.deleted = 0
+        # Bumped whenever row positions change (vacuum, clear)
+        self.generation = 0
+        self.names = []
+        self.name_codes = {}
+        self.code_counts = []
+        self._positions = None
+        self._lower_codes = {}
+        self._sorted_lower = []
+        self._last_id = 0
+        self.attached = False
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self._id = np.empty(capacity, dtype=np.int64)
+        self._alive = np.empty(capacity, dtype=bool)
+        self._ts = np.empty(capacity, dtype=np.int64)
+        self._code = np.empty(capacity, dtype=np.int32)
+        self._values = {f: np.empty(capacity, dtype=np.float64) for f in FIELDS}
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = max(len(self._ts), 1)
+        if needed <= len(self._ts):
+            return
+        while capacity < needed:
+            capacity *= 2
+        self._realloc(capacity)
+
+    def _realloc(self, capacity):
+        old_id, old_alive = self._id, self._alive
+        old_ts, old_code, old_values = self._ts, self._code, self._values
+        self._alloc(capacity)
+        self._id[:self.size] = old_id[:self.size]
+        self._alive[:self.size] = old_alive[:self.size]
+        self._ts[:self.size] = old_ts[:self.size]
+        self._code[:self.size] = old_code[:self.size]
+        for f in FIELDS:
+            self._values[f][:self.size] = old_values[f][:self.size]
+        self.attached = False
+
+    def attach(self, ids, timestamps, names, codes, values):
+        """Adopt column arrays as the contents of an empty store, without copying.
+
+        Arguments are laid out like extend_columns(); the arrays (for instance
+        fields of a copy-on-write memory-mapped record array) are used as the
+        columns directly, so only the pages that are actually read get loaded.
+        """
+        if self.size:
+            raise ValueError("attach() needs an empty store")
+        count = len(ids)
+        if not count:
+            return
+        mapping = np.array([self.code_for(name) for name in names], dtype=np.int32)
+        for code, n in zip(mapping.tolist(), np.bincount(codes, minlength=len(names)).tolist()):
+            self.code_counts[code] += n
+        if not np.array_equal(mapping, np.arange(len(names))):
+            codes = mapping[codes]
+        self._id = ids
+        self._alive = np.ones(count, dtype=bool)
+        self._ts = timestamps
+        self._code = codes
+        self._values = {f: values[f] for f in FIELDS}
+        self._last_id = max(self._last_id, int(ids.max()))
+        self._positions = None
+        self.size = count
+        self.attached = True
+
+    def detach(self):
+        """Copy attached columns into arrays the store owns (see attach())."""
+        if self.attached:
+            self._realloc(max(self.size, 1))
+
+    @property
+    def positions(self):
+        """{id: row} for every live row."""
+        if self._positions is None:
+            rows = self.live_indices()
+            self._positions = dict(zip(self._id[rows].tolist(), rows.tolist()))
+        return self._positions
+
+    def __len__(self):
+        return self.size - self.deleted
+
+    def new_id(self):
+        """Unique id above every id in the store (see next_id())."""
+        self._last_id = next_id(self._last_id)
+        return self._last_id
+
+    def _claim_id(self, reading_id):
+        if reading_id is None or reading_id in self.positions:
+            return self.new_id()
+        self._last_id = max(self._last_id, reading_id)
+        return reading_id
+
+    @property
+    def ids(self):
+        return self._id[:self.size]
+
+    @property
+    def alive(self):
+        return self._alive[:self.size]
+
+    def live_indices(self):
+        if not self.deleted:
+            return np.arange(self.size)
+        return np.flatnonzero(self.alive)
+
+    @property
+    def timestamps(self):
+        return self._ts[:self.size]
+
+    @property
+    def codes(self):
+        return self._code[:self.size]
+
+    @property
+    def ph(self):
+        return self._values["pH"][:self.size]
+
+    @property
+    def temperature(self):
+        return self._values["temperature"][:self.size]
+
+    @property
+    def ammonia(self):
+        return self._values["ammonia"][:self.size]
+
+    def column(self, field):
+        return self._values[field][:self.size]
+
+    def code_for(self, name):
+        """Dictionary code for an exact profile name, adding it if new."""
+        code = self.name_codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.code_counts.append(0)
+            self.name_codes[name] = code
+            lower = name.strip().lower()
+            if lower not in self._lower_codes:
+                self._lower_codes[lower] = []
+                insort(self._sorted_lower, lower)
+            self._lower_codes[lower].append(code)
+        return code
+
+    def codes_matching(self, name):
+        """All codes whose name equals name case-insensitively."""
+        return self._lower_codes.get(name.strip().lower(), [])
+
+    def profiles(self):
+        """{lower-cased name: codes} for every profile name seen so far."""
+        return self._lower_codes
+
+    def has_name(self, name):
+        """True if some live row uses name (case-insensitive)."""
+        return any(self.code_counts[c] for c in self.codes_matching(name))
+
+    def codes_with_prefix(self, prefix):
+        """Codes of live profiles whose name starts with prefix (case-insensitive)."""
+        key = prefix.strip().lower()
+        keys = self._sorted_lower
+        lo = bisect_left(keys, key)
+        hi = bisect_left(keys, key + "\U0010ffff", lo)
+        return [c for lower in keys[lo:hi] for c in self._lower_codes[lower] if self.code_counts[c]]
+
+    def append(self, name, timestamp, pH, temperature, ammonia, reading_id=None):
+        """Append one row and return its id."""
+        self._reserve(1)
+        i = self.size
+        reading_id = self._claim_id(reading_id)
+        self._id[i] = reading_id
+        self._alive[i] = True
+        if self._positions is not None:
+            self._positions[reading_id] = i
+        self._ts[i] = timestamp
+        self._code[i] = code = self.code_for(name)
+        self.code_counts[code] += 1
+        self._values["pH"][i] = pH
+        self._values["temperature"][i] = temperature
+        self._values["ammonia"][i] = ammonia
+        self.size += 1
+        return reading_id
+
+    def extend(self, records):
+        """Bulk-append reading dicts with vectorized column conversion.
+
+        Records without an "id" get a new one; returns how many did.
+        """
+        count = len(records)
+        if not count:
+            return 0
+        self._reserve(count)
+        start, end = self.size, self.size + count
+        assigned = 0
+        for k, r in enumerate(records):
+            reading_id = r.get("id")
+            if reading_id is None or reading_id in self.positions:
+                assigned += 1
+            reading_id = self._claim_id(reading_id)
+            self._id[start + k] = reading_id
+            self.positions[reading_id] = start + k
+        self._alive[start:end] = True
+        self._ts[start:end] = parse_timestamps([r["timestamp"] for r in records])
+        codes = [self.code_for(r["name"]) for r in records]
+        self._code[start:end] = codes
+        for code in codes:
+            self.code_counts[code] += 1
+        for f in FIELDS:
+            self._values[f][start:end] = [r[f] for r in records]
+        self.size = end
+        return assigned
+
+    def extend_columns(self, ids, timestamps, names, codes, values):
+        """Bulk-append decoded columns without building reading dicts.
+
+        codes index into names (the segment's own name dictionary) and values
+        maps each field to an array. Returns how many rows needed a new id.
+        """
+        count = len(ids)
+        if not count:
+            return 0
+        self._reserve(count)
+        start, end = self.size, self.size + count
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self) and _all_unique(ids):
+            # Fresh store and unique ids: no per-row id checks needed
+            self._id[start:end] = ids
+            if self._positions is not None:
+                self._positions.update(zip(ids.tolist(), range(start, end)))
+            self._last_id = max(self._last_id, int(ids.max()))
+            assigned = 0
+        else:
+            assigned = 0
+            for k, reading_id in enumerate(ids.tolist()):
+                if reading_id in self.positions:
+                    assigned += 1
+                reading_id = self._claim_id(reading_id)
+                self._id[start + k] = reading_id
+                self.positions[reading_id] = start + k
+        self._alive[start:end] = True
+        self._ts[start:end] = timestamps
+        mapping = np.array([self.code_for(name) for name in names], dtype=np.int32)
+        store_codes = mapping[np.asarray(codes, dtype=np.intp)]
+        self._code[start:end] = store_codes
+        for code, n in zip(mapping.tolist(), np.bincount(codes, minlength=len(names)).tolist()):
+            self.code_counts[code] += n
+        for f in FIELDS:
+            self._values[f][start:end] = values[f]
+        self.size = end
+        return assigned
+
+    def columns(self, indices=None):
+        """Live rows (or the given rows) as arrays, with codes into a compact name list.
+
+        Returns (ids, timestamps, names, codes, values), the layout
+        extend_columns() takes back.
+        """
+        if indices is None:
+            indices = self.live_indices()
+        used, codes = np.unique(self._code[indices], return_inverse=True)
+        names = [self.names[c] for c in used.tolist()]
+        values = {f: self._values[f][indices] for f in FIELDS}
+        return self._id[indices], self._ts[indices], names, codes.astype(np.int32), values
+
+    def update(self, reading_id, fields):
+        """Overwrite fields of one row in place. Returns False for unknown ids."""
+        i = self.positions.get(reading_id)
+        if i is None:
+            return False
+        for key, value in fields.items():
+            if key == "name":
+                code = self.code_for(value)
+                self.code_counts[self._code[i]] -= 1
+                self.code_counts[code] += 1
+                self._code[i] = code
+            elif key == "timestamp":
+                self._ts[i] = to_epoch(value)
+            else:
+                self._values[key][i] = value
+        return True
+
+    def delete(self, reading_id):
+        """Flag one row as deleted. Returns False for unknown ids."""
+        i = self.positions.pop(reading_id, None)
+        if i is None:
+            return False
+        self._alive[i] = False
+        self.code_counts[self._code[i]] -= 1
+        self.deleted += 1
+        if self.deleted * 2 > self.size:
+            self.vacuum()
+        return True
+
+    def vacuum(self):
+        """Physically drop deleted rows and rebuild the id index."""
+        keep = self.live_indices()
+        count = len(keep)
+        self._id[:count] = self._id[keep]
+        self._ts[:count] = self._ts[keep]
+        self._code[:count] = self._code[keep]
+        for f in FIELDS:
+            self._values[f][:count] = self._values[f][keep]
+        self._alive[:count] = True
+        self.size = count
+        self.deleted = 0
+        self.generation += 1
+        self._positions = None
+
+    def position(self, reading_id):
+        return self.positions.get(reading_id)
+
+    def clear(self):
+        self.size = 0
+        self.deleted = 0
+        self.generation += 1
+        self.names = []
+        self.name_codes = {}
+        self.code_counts = []
+        self._positions = None
+        self._lower_codes = {}
+        self._sorted_lower = []
+        if self.attached:
+            # Let go of the adopted arrays (and the file they may map)
+            self._alloc(1024)
+            self.attached = False
+
+    def rows(self, indices=None):
+        """Materialise reading dicts for the given row indices (all live rows by default)."""
+        if indices is None:
+            indices = self.live_indices()
+        indices = np.asarray(indices, dtype=np.intp)
+        ids = self._id[indices].tolist()
+        stamps = format_timestamps(self._ts[indices]).tolist()
+        codes = self._code[indices].tolist()
+        ph = self._values["pH"][indices].tolist()
+        temp = self._values["temperature"][indices].tolist()
+        ammonia = self._values["ammonia"][indices].tolist()
+        names = self.names
+        return [
+            {"id": ids[k], "timestamp": stamps[k], "name": names[codes[k]], "pH": ph[k],
+             "temperature": temp[k], "ammonia": ammonia[k]}
+            for k in range(len(codes))
+        ]
+
+    def view(self, indices=None):
+        if indices is None:
+            indices = self.live_indices()
+        return ReadingView(self, indices)
+
+
+class ReadingView:
+    """Lightweight selection of rows in a ReadingStore.
+
+    Column properties return NumPy arrays for the selected rows; indexing and
+    iteration yield reading dicts for code that still expects them.
+    """
+
+    def __init__(self, store, indices):
+        self.store = store
+        self.indices = np.asarray(indices, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __bool__(self):
+        return len(self.indices) > 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ReadingView(self.store, self.indices[key])
+        return self.store.rows([self.indices[key]])[0]
+
+    def __iter__(self):
+        return iter(self.store.rows(self.indices))
+
+    @property
+    def ids(self):
+        return self.store.ids[self.indices]
+
+    @property
+    def timestamps(self):
+        return self.store.timestamps[self.indices]
+
+    @property
+    def codes(self):
+        return self.store.codes[self.indices]
+
+    @property
+    def ph(self):
+        return self.store.ph[self.indices]
+
+    @property
+    def temperature(self):
+        return self.store.temperature[self.indices]
+
+    @property
+    def ammonia(self):
+        return self.store.ammonia[self.indices]
+
+    def column(self, field):
+        return self.store.column(field)[self.indices]
+
+    def to_dicts(self):
+        return self.store.rows(self.indices)
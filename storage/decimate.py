@@ -0,0 +1,42 @@
+"""Min/max decimation of time series for drawing"""
+
+import numpy as np
+
+
+def _first_of_runs(sorted_values):
+    """Indices where a new value starts in an already sorted array."""
+    return np.flatnonzero(np.diff(sorted_values, prepend=-1))
+
+
+def minmax_decimate(x, y, x_min, x_max, buckets):
+    """Reduce the points of (x, y) inside [x_min, x_max] to at most 2 * buckets.
+
+    x must be sorted. The range is split into equal-width buckets (one per
+    pixel column) and each bucket keeps its lowest and highest point in x
+    order, so spikes survive however far the series is zoomed out. One point
+    on each side of the range is kept so lines run to the plot edges.
+    """
+    lo = max(int(np.searchsorted(x, x_min, side="left")) - 1, 0)
+    hi = min(int(np.searchsorted(x, x_max, side="right")) + 1, len(x))
+    x, y = x[lo:hi], y[lo:hi]
+    if len(x) <= 2 * buckets:
+        return x, y
+
+    # First index of every non-empty bucket
+    edges = np.linspace(x[0], x[-1], buckets + 1)[:-1]
+    starts = np.unique(np.searchsorted(x, edges, side="left"))
+    lengths = np.diff(np.append(starts, len(x)))
+    bucket = np.repeat(np.arange(len(starts)), lengths)
+
+    # Position of the first minimum and first maximum inside each bucket
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    is_min = np.flatnonzero(y == mins[bucket])
+    is_max = np.flatnonzero(y == maxs[bucket])
+    first_min = is_min[_first_of_runs(bucket[is_min])]
+    first_max = is_max[_first_of_runs(bucket[is_max])]
+
+    picks = np.empty(2 * len(starts), dtype=np.intp)
+    picks[0::2] = np.minimum(first_min, first_max)
+    picks[1::2] = np.maximum(first_min, first_max)
+    return x[picks], y[picks]
@@ -0,0 +1,196 @@
+"""Append-only journal storage for readings"""
+
+import codecs
+import json
+import os
+import re
+from .column_store import parse_timestamp
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_array(f, block_size=1 << 20):
+    """Yield (element, bytes read so far) for each element of a JSON array.
+
+    f is a file opened in binary mode. Elements are decoded one at a time
+    from a sliding text buffer, so memory stays at about one block no
+    matter how large the file is.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, bytes_read, eof = "", 0, 0, False
+    started = False
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if not eof and len(buffer) - pos < block_size // 2:
+            block = f.read(block_size)
+            bytes_read += len(block)
+            eof = not block
+            buffer = buffer[pos:] + utf8.decode(block, final=eof)
+            pos = 0
+            continue
+        if pos == len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if not started:
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
+        # At least half a block is buffered past pos, so only an element
+        # larger than that can fail here and need another read
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            block = f.read(block_size)
+            bytes_read += len(block)
+            eof = not block
+            buffer = buffer[pos:] + utf8.decode(block, final=eof)
+            pos = 0
+            continue
+        pos = end
+        yield element, bytes_read
+
+
+class JournalStorage:
+    """Snapshot file plus an append-only journal of newer records.
+
+    New records are appended to the journal one JSON object per line, so a
+    save costs O(1) I/O. Updates and deletes are journaled as {"op": ...}
+    entries that target a record id and are replayed on load; a "batch" entry
+    groups several of them (or several new records) on one line so they
+    commit (or tear) together.
+    Once the journal
+    grows past COMPACT_THRESHOLD lines the owner folds it back into the
+    snapshot with save_from().
+    """
+
+    COMPACT_THRESHOLD = 1000
+    # Snapshot readings handed to the store at a time while loading
+    LOAD_CHUNK = 10000
+
+    def __init__(self, snapshot_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.journal_size = 0
+
+    def entries(self):
+        """Yield the journal entries in order, stopping at a torn final line."""
+        self.journal_size = 0
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from an interrupted append
+                    break
+                self.journal_size += 1
+                yield entry
+
+    def load_into(self, store, progress=None):
+        """Load every reading into a ReadingStore; returns how many got new ids.
+
+        The snapshot is streamed into the store LOAD_CHUNK readings at a
+        time, calling progress(bytes_read, total_bytes) after each chunk, and
+        the journal is replayed on top.
+        """
+        assigned = 0
+        if os.path.exists(self.snapshot_path):
+            total = os.path.getsize(self.snapshot_path)
+            chunk = []
+            with open(self.snapshot_path, "rb") as f:
+                for record, bytes_read in iter_json_array(f):
+                    chunk.append(record)
+                    if len(chunk) == self.LOAD_CHUNK:
+                        assigned += store.extend(chunk)
+                        chunk = []
+                        if progress:
+                            progress(bytes_read, total)
+            assigned += store.extend(chunk)
+            if progress:
+                progress(total, total)
+        return assigned + self.replay_journal(store)
+
+    def replay_journal(self, store):
+        """Apply the journal entries to store; returns how many got new ids.
+
+        Replay is idempotent: a save can crash after replacing the snapshot
+        but before removing the journal, so appends whose id is already in
+        the store are skipped rather than given a new id, and updates and
+        deletes simply apply again.
+        """
+        assigned = 0
+        for entry in self.entries():
+            op = entry.get("op")
+            if op is None:
+                if entry.get("id") is None:
+                    assigned += 1
+                elif store.position(entry["id"]) is not None:
+                    continue
+                store.append(entry["name"], parse_timestamp(entry["timestamp"]), entry["pH"],
+                             entry["temperature"], entry["ammonia"], entry.get("id"))
+                continue
+            subs = entry["entries"] if op == "batch" else [entry]
+            # Records appended by append_many(); one vectorized extend
+            added = [sub for sub in subs if sub.get("op") is None
+                     and (sub.get("id") is None or store.position(sub["id"]) is None)]
+            if added:
+                assigned += store.extend(added)
+            for sub in subs:
+                if sub.get("op") == "delete":
+                    store.delete(sub["id"])
+                elif sub.get("op") == "update":
+                    store.update(sub["id"], sub["fields"])
+        return assigned
+
+    def _write_entry(self, entry, sync=False):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self.journal_size += 1
+
+    def append(self, record):
+        self._write_entry(record)
+
+    def append_many(self, records):
+        """Journal several new records as one atomic, fsynced line."""
+        self._write_entry({"op": "batch", "entries": list(records)}, sync=True)
+
+    def update(self, reading_id, fields):
+        self._write_entry({"op": "update", "id": reading_id, "fields": fields})
+
+    def delete(self, reading_id):
+        self._write_entry({"op": "delete", "id": reading_id})
+
+    def update_many(self, patches):
+        """Journal several updates as one atomic line."""
+        entries = [{"op": "update", "id": reading_id, "fields": fields}
+                   for reading_id, fields in patches.items()]
+        self._write_entry({"op": "batch", "entries": entries})
+
+    def needs_compaction(self):
+        return self.journal_size >= self.COMPACT_THRESHOLD
+
+    def save_from(self, store):
+        self.write_snapshot(store.rows())
+
+    def write_snapshot(self, records):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            # dumps() uses the C encoder; dump() streams through the pure-Python one
+            f.write(json.dumps(records, indent=4))
+        os.replace(tmp_path, self.snapshot_path)
+
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_size = 0
@@ -0,0 +1,62 @@
+"""Per-user writer lock shared by the application and the daemons"""
+
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_NAME = "writer.lock"
+
+
+class UserLockedError(RuntimeError):
+    """Another program already writes this user's readings."""
+
+
+class UserLock:
+    """Exclusive claim on a user folder, so only one program writes it at a time.
+
+    Two writers would each compact the journal into their own snapshot and
+    delete lines the other appended. The claim is an OS lock on
+    <user_dir>/writer.lock, so it ends with the process even after a crash;
+    the file names the holder for the error message.
+    """
+
+    def __init__(self, user_dir):
+        self.path = os.path.join(user_dir, LOCK_NAME)
+        self.file = None
+
+    def acquire(self):
+        """Take the lock and return self; raises UserLockedError if it is held."""
+        f = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            try:
+                f.seek(0)
+                holder = f.read().strip()
+            except OSError:
+                holder = ""
+            f.close()
+            user = os.path.basename(os.path.dirname(self.path))
+            raise UserLockedError(f"{user}'s readings are already open in {holder or 'another program'}") from None
+        f.seek(0)
+        f.truncate()
+        f.write(f"{os.path.basename(sys.argv[0]) or 'python'} (pid {os.getpid()})\n")
+        f.flush()
+        self.file = f
+        return self
+
+    def release(self):
+        """Give the lock up; safe to call twice."""
+        if self.file is not None:
+            # Closing the file drops the lock
+            self.file.close()
+            self.file = None
@@ -0,0 +1,60 @@
+"""One-off conversion of user folders to another storage engine"""
+
+import os
+from .column_store import ReadingStore
+from .journal import JournalStorage
+from .records import RecordStorage
+from .segments import SegmentStorage
+
+# Files a conversion reads from, most efficient first
+SOURCES = (("readings.rec", RecordStorage), ("readings.seg", SegmentStorage))
+
+
+def open_source(user_dir):
+    """Storage for the user's readings.rec, readings.seg or readings.json, whichever exists first."""
+    for file_name, storage_class in SOURCES:
+        path = os.path.join(user_dir, file_name)
+        if os.path.exists(path):
+            return storage_class(path)
+    return JournalStorage(os.path.join(user_dir, "readings.json"))
+
+
+def migrate_user(user_dir, storage_class, file_name):
+    """Copy a user's readings into storage_class at user_dir/file_name.
+
+    The source (see open_source(), journal included) is left in place as a
+    backup. Returns the number of converted readings, or None if the user
+    already has file_name.
+    """
+    path = os.path.join(user_dir, file_name)
+    if os.path.exists(path):
+        return None
+    store = ReadingStore()
+    open_source(user_dir).load_into(store)
+    target = storage_class(path)
+    try:
+        target.save_from(store)
+    finally:
+        close = getattr(target, "close", None)
+        if close:
+            close()
+    return len(store)
+
+
+def migrate_users(storage_class, file_name, base_dir="users"):
+    """migrate_user() for every user folder under base_dir; {username: count or None}."""
+    results = {}
+    if not os.path.isdir(base_dir):
+        return results
+    for username in sorted(os.listdir(base_dir)):
+        user_dir = os.path.join(base_dir, username)
+        if os.path.isdir(user_dir):
+            results[username] = migrate_user(user_dir, storage_class, file_name)
+    return results
+
+
+def main(storage_class, file_name):
+    """Command line entry of the engine modules: convert every user and report."""
+    for username, count in migrate_users(storage_class, file_name).items():
+        status = "already converted" if count is None else f"{count} readings"
+        print(f"{username}: {status}")
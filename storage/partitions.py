@@ -0,0 +1,315 @@
+"""Monthly partitioned reading segments with per-partition zone maps"""
+
+import json
+import operator
+import os
+import numpy as np
+from .aggregates import RunningTotals
+from .column_store import FIELDS, ReadingStore, parse_timestamp, to_epoch
+from .journal import JournalStorage
+from .records import open_records, write_records
+
+MANIFEST_VERSION = 1
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le, "==": operator.eq}
+
+
+def months_of(timestamps):
+    """Calendar month of epoch-second timestamps, as months since 1970-01."""
+    seconds = np.asarray(timestamps, dtype=np.int64).astype("datetime64[s]")
+    return seconds.astype("datetime64[M]").astype(np.int64)
+
+
+def month_label(month):
+    """"YYYY-MM" for a months_of() value."""
+    return np.datetime_as_string(np.datetime64(int(month), "M"))
+
+
+def check_where(where):
+    """Validate (field, op, value) conditions; returns them as a list."""
+    where = list(where or [])
+    for field, op, _ in where:
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {op}")
+    return where
+
+
+def zone_may_match(zone, where):
+    """False when a partition's min/max show no row can meet every condition."""
+    for field, op, value in where:
+        low, high = zone[f"{field}_min"], zone[f"{field}_max"]
+        if op == ">" and high <= value or op == ">=" and high < value:
+            return False
+        if op == "<" and low >= value or op == "<=" and low > value:
+            return False
+        if op == "==" and not low <= value <= high:
+            return False
+    return True
+
+
+class PartitionedStorage(JournalStorage):
+    """Readings split into one record file per calendar month, plus the journal.
+
+    The partitions folder holds <YYYY-MM>-<generation>.rec files (see
+    storage.records) and manifest.json, which lists every partition with a
+    zone map: row count, first/last timestamp, the min/max of every field
+    and the lower-cased profile names it contains, plus the sums behind
+    totals(). Appends, updates and deletes go to the journal as with
+    SegmentStorage.
+
+    save_from() only rewrites months whose rows changed, and query() only
+    opens the partitions whose zone map can match. New files get a new
+    generation and the manifest is replaced last, so an interrupted save
+    leaves the previous manifest and its files intact. A store holding only
+    some profiles can be saved too (see save_from()).
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, folder):
+        self.folder = folder
+        super().__init__(os.path.join(folder, self.MANIFEST_NAME))
+        self.journal_path = os.path.join(folder, "readings.journal")
+        # Ids updated since the last save; updates keep a month's row count
+        # and ids, so they are the only change save_from() cannot see
+        self.updated_ids = set()
+
+    def manifest(self):
+        if not os.path.exists(self.snapshot_path):
+            return {"version": MANIFEST_VERSION, "generation": 0, "partitions": {}}
+        with open(self.snapshot_path, "r") as f:
+            return json.load(f)
+
+    def _read(self, entry):
+        records, names = open_records(os.path.join(self.folder, entry["file"]))
+        return (records["id"], records["timestamp"], names, records["code"],
+                {f: records[f] for f in FIELDS})
+
+    def load_into(self, store, progress=None):
+        partitions = self.manifest()["partitions"]
+        for month in sorted(partitions):
+            store.extend_columns(*self._read(partitions[month]))
+        assigned = self.replay_journal(store)
+        self.updated_ids = self._journal_updates()[0]
+        return assigned
+
+    def journaled_profiles(self):
+        """Lower-cased profiles the journal appends to, or None if it also edits readings.
+
+        An update or delete only names a reading id, so which profile it
+        belongs to is unknown until every partition is read.
+        """
+        names = set()
+        for entry in self.entries():
+            for sub in entry["entries"] if entry.get("op") == "batch" else [entry]:
+                if sub.get("op") is not None:
+                    return None
+                names.add(sub["name"].strip().lower())
+        return names
+
+    def _journal_updates(self):
+        """(ids, fields) touched by update entries in the journal."""
+        ids, fields = set(), set()
+        for entry in self.entries():
+            for sub in entry["entries"] if entry.get("op") == "batch" else [entry]:
+                if sub.get("op") == "update":
+                    ids.add(sub["id"])
+                    fields.update(sub["fields"])
+        return ids, fields
+
+    def update(self, reading_id, fields):
+        self.updated_ids.add(reading_id)
+        super().update(reading_id, fields)
+
+    def update_many(self, patches):
+        self.updated_ids.update(patches)
+        super().update_many(patches)
+
+    def partition_keys(self, store, rows):
+        """Integer key arrays, one value per row, whose combinations are the partitions."""
+        return [months_of(store.timestamps[rows])]
+
+    def partition_label(self, store, keys):
+        """Manifest key and file name stem of the partition with these key values."""
+        return month_label(keys[0])
+
+    def summary(self, partitions):
+        """Extra manifest fields derived from the partition entries."""
+        return {}
+
+    def _groups(self, store):
+        """(rows, label) of every partition the live rows of store fall into."""
+        rows = store.live_indices()
+        if not len(rows):
+            return []
+        keys = self.partition_keys(store, rows)
+        order = np.lexsort(keys[::-1])
+        rows, keys = rows[order], [key[order] for key in keys]
+        change = np.zeros(len(rows), dtype=bool)
+        for key in keys:
+            change[1:] |= key[1:] != key[:-1]
+        bounds = np.flatnonzero(change)
+        starts = np.append(0, bounds)
+        return [(group, self.partition_label(store, [key[start] for key in keys]))
+                for group, start in zip(np.split(rows, bounds), starts.tolist())]
+
+    def _with_unloaded_rows(self, store, loaded, entries):
+        """A copy of store plus the rows of profiles outside loaded from the given partitions."""
+        full = ReadingStore()
+        full.extend_columns(*store.columns(store.live_indices()))
+        for entry in entries:
+            ids, timestamps, names, codes, values = self._read(entry)
+            others = [code for code, name in enumerate(names) if name.strip().lower() not in loaded]
+            keep = np.isin(codes, others)
+            full.extend_columns(ids[keep], timestamps[keep], names, codes[keep],
+                                {f: values[f][keep] for f in FIELDS})
+        return full
+
+    def save_from(self, store, loaded=None):
+        """Rewrite the partitions whose rows changed, then the manifest.
+
+        loaded, when given, is the set of lower-cased profiles store holds
+        completely, the rest being only on disk; the journal must not touch
+        any other profile. Partitions without a loaded profile are kept as
+        they are, and the others are rebuilt, taking the rows of unloaded
+        profiles from their current files.
+        """
+        os.makedirs(self.folder, exist_ok=True)
+        manifest = self.manifest()
+        old = manifest["partitions"]
+        generation = manifest["generation"] + 1
+
+        groups = self._groups(store)
+        partitions = {}
+        if loaded is not None:
+            rebuilt = {label for _, label in groups}
+            rebuilt.update(label for label, entry in old.items() if loaded.intersection(entry["names"]))
+            partitions = {label: entry for label, entry in old.items() if label not in rebuilt}
+            mixed = [old[label] for label in sorted(rebuilt)
+                     if label in old and not loaded.issuperset(old[label]["names"])]
+            if mixed:
+                store = self._with_unloaded_rows(store, loaded, mixed)
+                groups = self._groups(store)
+
+        updated = np.fromiter(self.updated_ids, dtype=np.int64, count=len(self.updated_ids))
+        for group, label in groups:
+            ids = store.ids[group]
+            # int64 sums wrap around, which is fine for a fingerprint
+            fingerprint = [len(group), int(ids.sum())]
+            entry = old.get(label)
+            if entry is not None and entry["fingerprint"] == fingerprint and not np.isin(ids, updated).any():
+                partitions[label] = entry
+                continue
+            file_name = f"{label}-{generation}.rec"
+            path = os.path.join(self.folder, file_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_records(path, *store.columns(group))
+            timestamps = store.timestamps[group]
+            entry = {"file": file_name, "fingerprint": fingerprint, "count": len(group),
+                     "first": int(timestamps.min()), "last": int(timestamps.max()),
+                     "last_id": int(store.ids[group].max()),
+                     "names": sorted({store.names[c].strip().lower() for c in np.unique(store.codes[group]).tolist()})}
+            for f in FIELDS:
+                column = store.column(f)[group]
+                entry[f"{f}_min"] = float(column.min())
+                entry[f"{f}_max"] = float(column.max())
+                entry[f"{f}_sum"] = float(column.sum())
+                entry[f"{f}_squares"] = float(column @ column)
+            partitions[label] = entry
+
+        manifest = {"version": MANIFEST_VERSION, "generation": generation, "partitions": partitions}
+        manifest.update(self.summary(partitions))
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(tmp_path, self.snapshot_path)
+
+        kept = {entry["file"] for entry in partitions.values()}
+        for entry in old.values():
+            if entry["file"] not in kept:
+                path = os.path.join(self.folder, entry["file"])
+                os.remove(path)
+                parent = os.path.dirname(path)
+                if parent != self.folder and not os.listdir(parent):
+                    os.rmdir(parent)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_size = 0
+        self.updated_ids = set()
+
+    def totals(self):
+        """(RunningTotals of every reading, lower-cased profile names), without opening a partition.
+
+        Sums come from the manifest and journaled appends are added on top.
+        Returns None when that cannot be exact: the journal updates or deletes
+        readings, holds an append the snapshot may already contain (a save
+        interrupted before it removed the journal), or the manifest was
+        written before it kept sums.
+        """
+        overall, names = RunningTotals(), set()
+        last_id = None
+        for entry in self.manifest()["partitions"].values():
+            if "last_id" not in entry:
+                return None
+            overall.count += entry["count"]
+            for f in FIELDS:
+                overall.sums[f] += entry[f"{f}_sum"]
+                overall.squares[f] += entry[f"{f}_squares"]
+            overall.first = entry["first"] if overall.first is None else min(overall.first, entry["first"])
+            overall.last = entry["last"] if overall.last is None else max(overall.last, entry["last"])
+            last_id = entry["last_id"] if last_id is None else max(last_id, entry["last_id"])
+            names.update(entry["names"])
+        for entry in self.entries():
+            for sub in entry["entries"] if entry.get("op") == "batch" else [entry]:
+                if sub.get("op") is not None or sub.get("id") is None or \
+                        last_id is not None and sub["id"] <= last_id:
+                    return None
+                overall.add(parse_timestamp(sub["timestamp"]), sub)
+                names.add(sub["name"].strip().lower())
+        return overall, names
+
+    def query(self, name=None, start=None, end=None, where=None):
+        """Readings matching a profile, a time window and conditions, as a ReadingView.
+
+        name is matched case-insensitively (all profiles when None), start
+        and end are inclusive, and where is a list of (field, op, value)
+        conditions with op one of >, >=, <, <= and ==, e.g.
+        [("ammonia", ">", 0.5)].
+        Only partitions whose zone map can match are opened; journaled
+        changes are applied on top.
+        """
+        where = check_where(where)
+        start = None if start is None else to_epoch(start)
+        end = None if end is None else to_epoch(end)
+        key = None if name is None else name.strip().lower()
+        # A journaled update can move a row into the result, so the zone maps
+        # of the fields it changed can no longer rule a partition out
+        _, changed = self._journal_updates()
+        prune = [condition for condition in where if condition[0] not in changed]
+
+        store = ReadingStore()
+        for _, entry in sorted(self.manifest()["partitions"].items()):
+            if start is not None and entry["last"] < start or end is not None and entry["first"] > end:
+                continue
+            if key is not None and "name" not in changed and key not in entry["names"]:
+                continue
+            if zone_may_match(entry, prune):
+                store.extend_columns(*self._read(entry))
+        self.replay_journal(store)
+
+        mask = store.alive.copy()
+        if key is not None:
+            mask &= np.isin(store.codes, store.codes_matching(key))
+        if start is not None:
+            mask &= store.timestamps >= start
+        if end is not None:
+            mask &= store.timestamps <= end
+        for field, op, value in where:
+            mask &= OPERATORS[op](store.column(field), value)
+        return store.view(np.flatnonzero(mask))
+
+
+if __name__ == "__main__":
+    from .migrate import main
+    main(PartitionedStorage, "partitions")
@@ -0,0 +1,306 @@
+"""Multi-resolution min/max/mean rollups of readings"""
+
+import os
+import numpy as np
+from .column_store import FIELDS
+
+STAT_COLUMNS = tuple(f"{f}_{s}" for f in FIELDS for s in ("min", "max", "sum"))
+
+
+class Rollup:
+    """Per-bucket count, min, max and sum of every field at one bucket width.
+
+    Buckets are sorted by start time. Columns grow by doubling like
+    ReadingStore, so adding a reading to the newest bucket or opening a new
+    one is O(1).
+    """
+
+    def __init__(self, width, capacity=64):
+        self.width = width
+        self.size = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        self._start = np.empty(capacity, dtype=np.int64)
+        self._count = np.empty(capacity, dtype=np.int64)
+        self._stats = {name: np.empty(capacity, dtype=np.float64) for name in STAT_COLUMNS}
+
+    def _columns(self):
+        return [self._start, self._count] + list(self._stats.values())
+
+    def _reserve(self, extra):
+        capacity = len(self._start)
+        if self.size + extra <= capacity:
+            return
+        while capacity < self.size + extra:
+            capacity *= 2
+        old = self._columns()
+        self._alloc(capacity)
+        for new, previous in zip(self._columns(), old):
+            new[:self.size] = previous[:self.size]
+
+    @classmethod
+    def build(cls, width, timestamps, values):
+        """Vectorized rollup of timestamps with values {field: array}."""
+        rollup = cls(width, capacity=1)
+        if not len(timestamps):
+            return rollup
+        order = np.argsort(timestamps, kind="stable")
+        keys = timestamps[order] - timestamps[order] % width
+        starts = np.flatnonzero(np.diff(keys, prepend=keys[0] - 1))
+        count = len(starts)
+        rollup._reserve(count)
+        rollup._start[:count] = keys[starts]
+        rollup._count[:count] = np.diff(np.append(starts, len(keys)))
+        for f in FIELDS:
+            column = np.asarray(values[f], dtype=np.float64)[order]
+            rollup._stats[f"{f}_min"][:count] = np.minimum.reduceat(column, starts)
+            rollup._stats[f"{f}_max"][:count] = np.maximum.reduceat(column, starts)
+            rollup._stats[f"{f}_sum"][:count] = np.add.reduceat(column, starts)
+        rollup.size = count
+        return rollup
+
+    def add(self, timestamp, values):
+        """Fold one reading into its bucket, opening the bucket if needed."""
+        key = timestamp - timestamp % self.width
+        i = self.size - 1
+        if not self.size or key > self._start[i]:
+            # The common case: a reading newer than every bucket
+            self._reserve(1)
+            i = self.size
+            self.size += 1
+            self._start[i] = key
+            self._count[i] = 0
+        elif key != self._start[i]:
+            i = int(np.searchsorted(self.starts, key))
+            if self._start[i] != key:
+                self._reserve(1)
+                for column in self._columns():
+                    column[i + 1:self.size + 1] = column[i:self.size].copy()
+                self.size += 1
+                self._start[i] = key
+                self._count[i] = 0
+
+        first = self._count[i] == 0
+        self._count[i] += 1
+        for f in FIELDS:
+            value = float(values[f])
+            lo, hi, total = self._stats[f"{f}_min"], self._stats[f"{f}_max"], self._stats[f"{f}_sum"]
+            lo[i] = value if first else min(lo[i], value)
+            hi[i] = value if first else max(hi[i], value)
+            total[i] = value if first else total[i] + value
+
+    @property
+    def starts(self):
+        return self._start[:self.size]
+
+    @property
+    def counts(self):
+        return self._count[:self.size]
+
+    def minimum(self, field):
+        return self._stats[f"{field}_min"][:self.size]
+
+    def maximum(self, field):
+        return self._stats[f"{field}_max"][:self.size]
+
+    def mean(self, field):
+        return self._stats[f"{field}_sum"][:self.size] / self.counts
+
+    def table(self, start=None, end=None):
+        """Buckets starting within [start, end] as {column: array}.
+
+        Columns are start, count and <field>_min, <field>_max and <field>_mean.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.starts, start, side="left"))
+        hi = self.size if end is None else int(np.searchsorted(self.starts, end, side="right"))
+        table = {"start": self.starts[lo:hi].copy(), "count": self.counts[lo:hi].copy()}
+        for f in FIELDS:
+            table[f"{f}_min"] = self.minimum(f)[lo:hi].copy()
+            table[f"{f}_max"] = self.maximum(f)[lo:hi].copy()
+            table[f"{f}_mean"] = self.mean(f)[lo:hi]
+        return table
+
+    def arrays(self):
+        return {name: column[:self.size] for name, column in
+                zip(["start", "count"] + list(self._stats), self._columns())}
+
+    @classmethod
+    def from_arrays(cls, width, arrays):
+        rollup = cls(width, capacity=max(len(arrays["start"]), 1))
+        rollup.size = len(arrays["start"])
+        rollup._start[:rollup.size] = arrays["start"]
+        rollup._count[:rollup.size] = arrays["count"]
+        for name, column in rollup._stats.items():
+            column[:rollup.size] = arrays[name]
+        return rollup
+
+
+class RollupPyramid:
+    """Rollups of every profile at 1 minute, 1 hour, 1 day and 1 week buckets.
+
+    Profiles are keyed by lower-cased name, like ReadingManager.query.
+    New readings are folded in incrementally; updates and deletes only mark a
+    profile stale, and it is rebuilt from the store the next time it is
+    asked for. The pyramid is saved to an .npz file along with a fingerprint
+    of each profile's rows, so on the next start only the profiles that
+    changed since the last save are rebuilt. load() only notes the file; a
+    saved profile is checked against the store (which reads its rows) the
+    first time it is asked for, and the rest when the pyramid is saved again.
+    dirty tells whether something was built or added since the last save.
+    """
+
+    LEVELS = (("1m", 60), ("1h", 3600), ("1d", 86400), ("1w", 7 * 86400))
+
+    def __init__(self, store):
+        self.store = store
+        self.profiles = {}
+        self.saved_path = None
+        self.checked = set()
+        self.dirty = False
+
+    @staticmethod
+    def key(name):
+        return name.strip().lower()
+
+    def add(self, name, timestamp, values):
+        levels = self.profiles.get(self.key(name))
+        if levels is None:
+            # Not built yet: the next levels() call builds it with this reading
+            return
+        for rollup in levels:
+            rollup.add(timestamp, values)
+        self.dirty = True
+
+    def invalidate(self, names=None):
+        """Drop the rollups of the given profile names (all when None)."""
+        if names is None:
+            self.profiles = {}
+            self.saved_path = None
+            return
+        for name in names:
+            self.profiles.pop(self.key(name), None)
+
+    def _rows(self, key):
+        codes = self.store.codes_matching(key)
+        return np.flatnonzero(np.isin(self.store.codes, codes) & self.store.alive)
+
+    def levels(self, name):
+        """Rollups for one profile, finest first, building them if needed."""
+        key = self.key(name)
+        levels = self.profiles.get(key)
+        if levels is None:
+            rows = self._rows(key)
+            if self.saved_path is not None and key not in self.checked:
+                self._load_saved({key: self._fingerprint(rows)})
+                levels = self.profiles.get(key)
+        if levels is None:
+            timestamps = self.store.timestamps[rows]
+            values = {f: self.store.column(f)[rows] for f in FIELDS}
+            levels = [Rollup.build(width, timestamps, values) for _, width in self.LEVELS]
+            self.profiles[key] = levels
+            self.dirty = True
+        return levels
+
+    def level(self, name, label):
+        """The Rollup of one profile at one of the LEVELS labels ("1m", "1h", "1d", "1w")."""
+        labels = [level_label for level_label, _ in self.LEVELS]
+        if label not in labels:
+            raise ValueError(f"Unknown rollup period: {label}")
+        return self.levels(name)[labels.index(label)]
+
+    def _fingerprint(self, rows):
+        store = self.store
+        return np.array([len(rows), store.timestamps[rows].astype(np.float64).sum()] +
+                        [store.column(f)[rows].sum() for f in FIELDS])
+
+    def fingerprints(self):
+        """{profile key: row count and column sums} for every live profile."""
+        store = self.store
+        rows = store.live_indices()
+        codes = store.codes[rows]
+        size = len(store.names)
+        columns = [np.bincount(codes, minlength=size).astype(np.float64),
+                   np.bincount(codes, weights=store.timestamps[rows].astype(np.float64), minlength=size)]
+        columns += [np.bincount(codes, weights=store.column(f)[rows], minlength=size) for f in FIELDS]
+        per_code = np.stack(columns, axis=1)
+
+        result = {}
+        for key, key_codes in store.profiles().items():
+            fingerprint = per_code[key_codes].sum(axis=0)
+            if fingerprint[0]:
+                result[key] = fingerprint
+        return result
+
+    def save(self, path, loaded=None):
+        """Write every built profile to path (an .npz file).
+
+        loaded, when given, is the set of profile keys the store holds; the
+        rollups path already has for every other profile are carried over.
+        """
+        fingerprints = self.fingerprints()
+        if self.saved_path is not None:
+            # Keep the still valid profiles nobody has asked for yet
+            self._load_saved({key: fingerprint for key, fingerprint in fingerprints.items()
+                              if key not in self.checked})
+            self.saved_path = None
+        arrays = {}
+        keys = [key for key in self.profiles if key in fingerprints]
+        for k, key in enumerate(keys):
+            arrays[f"p{k}_fingerprint"] = fingerprints[key]
+            for (label, _), rollup in zip(self.LEVELS, self.profiles[key]):
+                for name, column in rollup.arrays().items():
+                    arrays[f"p{k}_{label}_{name}"] = column
+        if loaded is not None and os.path.exists(path):
+            self._carry_over(path, loaded, keys, arrays)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, names=np.array(keys, dtype=str), **arrays)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @staticmethod
+    def _carry_over(path, loaded, keys, arrays):
+        """Add the profiles saved in path that are not in loaded to keys and arrays."""
+        try:
+            with np.load(path) as data:
+                for k, key in enumerate(data["names"].tolist()):
+                    if key in loaded or key in keys:
+                        continue
+                    prefix = f"p{k}_"
+                    for name in data.files:
+                        if name.startswith(prefix):
+                            arrays[f"p{len(keys)}_{name[len(prefix):]}"] = data[name]
+                    keys.append(key)
+        except (OSError, ValueError, KeyError):
+            # A damaged file only costs a rebuild
+            pass
+
+    def load(self, path):
+        """Replace the pyramid with the saved profiles that still match the store.
+
+        The file is read on first use; see the class docstring.
+        """
+        self.profiles = {}
+        self.checked = set()
+        self.dirty = False
+        self.saved_path = path if os.path.exists(path) else None
+
+    def _load_saved(self, fingerprints):
+        """Adopt the saved rollups of the profiles in fingerprints that still match."""
+        self.checked.update(fingerprints)
+        try:
+            with np.load(self.saved_path) as data:
+                for k, key in enumerate(data["names"].tolist()):
+                    current = fingerprints.get(key)
+                    # Sums are taken in a different order than when saved
+                    if key in self.profiles or current is None or \
+                            not np.allclose(current, data[f"p{k}_fingerprint"], rtol=1e-12, atol=0):
+                        continue
+                    self.profiles[key] = [
+                        Rollup.from_arrays(width, {name: data[f"p{k}_{label}_{name}"]
+                                                   for name in ("start", "count") + STAT_COLUMNS})
+                        for label, width in self.LEVELS
+                    ]
+        except (OSError, ValueError, KeyError):
+            # A damaged file only costs a rebuild
+            self.saved_path = None
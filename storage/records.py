@@ -0,0 +1,89 @@
+"""Fixed-width binary reading files that are opened with mmap"""
+
+import json
+import os
+import numpy as np
+from .column_store import FIELDS
+from .segments import SegmentStorage
+
+RECORD_MAGIC = b"TQRECORD"
+RECORD_VERSION = 1
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"), ("names_size", "<u4"), ("count", "<u8")])
+# One fixed-width little-endian record per reading; code indexes the name list
+RECORD_DTYPE = np.dtype([("id", "<i8"), ("timestamp", "<i8"), ("code", "<i4")] +
+                        [(f, "<f8") for f in FIELDS])
+
+
+def write_records(path, ids, timestamps, names, codes, values):
+    """Write reading columns as a header, a JSON name list and a record array."""
+    records = np.empty(len(ids), dtype=RECORD_DTYPE)
+    records["id"] = ids
+    records["timestamp"] = timestamps
+    records["code"] = codes
+    for f in FIELDS:
+        records[f] = values[f]
+    names_blob = json.dumps(names).encode("utf-8")
+    # Pad with JSON whitespace so the records start 8-byte aligned
+    names_blob += b" " * (-(HEADER_DTYPE.itemsize + len(names_blob)) % 8)
+    header = np.array([(RECORD_MAGIC, RECORD_VERSION, len(names_blob), len(ids))], dtype=HEADER_DTYPE)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(names_blob)
+        f.write(records.tobytes())
+    os.replace(tmp_path, path)
+
+
+def open_records(path):
+    """(records, names) with records a copy-on-write memory map of the file.
+
+    Nothing past the header is read here; pages of the record array are
+    loaded by the OS as they are touched, and writes to it stay private to
+    this process.
+    """
+    with open(path, "rb") as f:
+        header = np.frombuffer(f.read(HEADER_DTYPE.itemsize), dtype=HEADER_DTYPE)
+        if len(header) != 1 or header["magic"][0] != RECORD_MAGIC:
+            raise ValueError(f"Not a reading record file: {path}")
+        if header["version"][0] != RECORD_VERSION:
+            raise ValueError(f"Unsupported record file version: {header['version'][0]}")
+        names_size = int(header["names_size"][0])
+        names = json.loads(f.read(names_size))
+    count = int(header["count"][0])
+    if not count:
+        return np.zeros(0, dtype=RECORD_DTYPE), names
+    records = np.memmap(path, dtype=RECORD_DTYPE, mode="c",
+                        offset=HEADER_DTYPE.itemsize + names_size, shape=(count,))
+    return records, names
+
+
+class RecordStorage(SegmentStorage):
+    """Memory-mapped record file (readings.rec) plus the JSON-lines journal.
+
+    Loading maps the file and hands the record fields to
+    ReadingStore.attach() as its columns, so opening even a multi-million
+    reading history costs a header read and no parsing. The journal works
+    exactly as for SegmentStorage.
+    """
+
+    def load_into(self, store, progress=None):
+        if os.path.exists(self.snapshot_path):
+            records, names = open_records(self.snapshot_path)
+            store.attach(records["id"], records["timestamp"], names, records["code"],
+                         {f: records[f] for f in FIELDS})
+        return self.replay_journal(store)
+
+    def save_from(self, store):
+        # The store may be reading from the file being replaced; Windows
+        # refuses to replace a mapped file
+        store.detach()
+        write_records(self.snapshot_path, *store.columns())
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_size = 0
+
+
+if __name__ == "__main__":
+    from .migrate import main
+    main(RecordStorage, "readings.rec")
@@ -0,0 +1,84 @@
+"""Per-profile sharded reading storage with a catalog"""
+
+import re
+import zlib
+import numpy as np
+from .column_store import FIELDS
+from .partitions import PartitionedStorage, months_of, month_label
+
+
+def shard_folder(key):
+    """File-system safe folder name for a lower-cased profile name."""
+    slug = re.sub(r"[^a-z0-9]+", "-", key).strip("-")[:40] or "profile"
+    # The checksum keeps names that slug the same apart ("Tank #1" / "Tank 1")
+    return f"{slug}-{zlib.crc32(key.encode('utf-8')):08x}"
+
+
+class ShardedStorage(PartitionedStorage):
+    """One shard folder per profile, each split into monthly record files.
+
+    catalog.json lists every partition like PartitionedStorage's manifest,
+    keyed "<shard folder>/<YYYY-MM>", plus a "profiles" section with each
+    profile's shard folder, reading count and time span. A save only
+    rewrites the months of the profiles that changed, and query(name) only
+    opens that profile's shard.
+    """
+
+    MANIFEST_NAME = "catalog.json"
+
+    def __init__(self, folder):
+        super().__init__(folder)
+        self._profile_keys = []
+
+    def partition_keys(self, store, rows):
+        # Profiles are numbered by lower-cased name, so names that differ
+        # only in case share a shard
+        profile_of_code = np.zeros(len(store.names), dtype=np.int64)
+        self._profile_keys = sorted(store.profiles())
+        for index, key in enumerate(self._profile_keys):
+            profile_of_code[store.profiles()[key]] = index
+        return [profile_of_code[store.codes[rows]], months_of(store.timestamps[rows])]
+
+    def partition_label(self, store, keys):
+        return f"{shard_folder(self._profile_keys[keys[0]])}/{month_label(keys[1])}"
+
+    def summary(self, partitions):
+        profiles = {}
+        for label, entry in partitions.items():
+            key = entry["names"][0]
+            profile = profiles.setdefault(key, {"folder": label.split("/")[0], "count": 0,
+                                                "first": entry["first"], "last": entry["last"]})
+            profile["count"] += entry["count"]
+            profile["first"] = min(profile["first"], entry["first"])
+            profile["last"] = max(profile["last"], entry["last"])
+        return {"profiles": profiles}
+
+    def profiles(self):
+        """{lower-cased name: folder, count, first and last timestamp} from the catalog."""
+        return self.manifest().get("profiles", {})
+
+    def load_into(self, store, progress=None):
+        # Shards hold one profile each; merge them back into time order
+        parts = [self._read(entry) for _, entry in sorted(self.manifest()["partitions"].items())]
+        if parts:
+            codes, name_codes = [], {}
+            for _, _, part_names, part_codes, _ in parts:
+                mapping = np.array([name_codes.setdefault(name, len(name_codes)) for name in part_names],
+                                   dtype=np.int32)
+                codes.append(mapping[part_codes])
+            names = list(name_codes)
+            ids = np.concatenate([part[0] for part in parts])
+            timestamps = np.concatenate([part[1] for part in parts])
+            codes = np.concatenate(codes)
+            values = {f: np.concatenate([part[4][f] for part in parts]) for f in FIELDS}
+            order = np.lexsort((ids, timestamps))
+            store.extend_columns(ids[order], timestamps[order], names, codes[order],
+                                 {f: values[f][order] for f in FIELDS})
+        assigned = self.replay_journal(store)
+        self.updated_ids = self._journal_updates()[0]
+        return assigned
+
+
+if __name__ == "__main__":
+    from .migrate import main
+    main(ShardedStorage, "shards")
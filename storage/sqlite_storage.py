@@ -0,0 +1,165 @@
+"""SQLite storage for readings"""
+
+import sqlite3
+from .aggregates import RunningTotals
+from .column_store import FIELDS, ReadingStore, format_timestamp, parse_timestamp, to_epoch
+
+COLUMNS = ("id", "timestamp", "name", "pH", "temperature", "ammonia")
+EDITABLE = ("timestamp", "name", "pH", "temperature", "ammonia")
+
+
+class SQLiteStorage:
+    """Readings table keyed by reading id, indexed on (name, timestamp) and timestamp.
+
+    Exposes the same load_into/append/save_from interface as JournalStorage.
+    Each append, update and delete is its own transaction, so nothing needs
+    compacting. Like PartitionedStorage it also offers query() and totals(),
+    so ReadingManager reads one profile (or the newest readings) through the
+    indexes instead of loading the whole table at login.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # WriteBehindStorage writes from its worker thread; it never overlaps
+        # those writes with reads, so the connection can be shared
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS readings ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " timestamp TEXT NOT NULL,"
+            " name TEXT NOT NULL COLLATE NOCASE,"
+            " pH REAL, temperature REAL, ammonia REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_readings_name_ts ON readings (name, timestamp)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (timestamp)"
+        )
+        self.conn.commit()
+
+    def _rows_to_dicts(self, rows):
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def load(self):
+        rows = self.conn.execute(
+            "SELECT id, timestamp, name, pH, temperature, ammonia FROM readings ORDER BY rowid"
+        ).fetchall()
+        return self._rows_to_dicts(rows)
+
+    def load_into(self, store, progress=None):
+        """Load every reading into a ReadingStore; returns how many got new ids."""
+        return store.extend(self.load())
+
+    def append(self, record):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO readings (id, timestamp, name, pH, temperature, ammonia) VALUES (?, ?, ?, ?, ?, ?)",
+                tuple(record.get(c) for c in COLUMNS),
+            )
+
+    def append_many(self, records):
+        """Insert several records in one transaction."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO readings (id, timestamp, name, pH, temperature, ammonia) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(r.get(c) for c in COLUMNS) for r in records],
+            )
+
+    def _update(self, reading_id, fields):
+        columns = [c for c in fields if c in EDITABLE]
+        if not columns:
+            return
+        assignments = ", ".join(f"{c} = ?" for c in columns)
+        self.conn.execute(
+            f"UPDATE readings SET {assignments} WHERE id = ?",
+            [fields[c] for c in columns] + [reading_id],
+        )
+
+    def update(self, reading_id, fields):
+        with self.conn:
+            self._update(reading_id, fields)
+
+    def update_many(self, patches):
+        """Apply several updates in one transaction."""
+        with self.conn:
+            for reading_id, fields in patches.items():
+                self._update(reading_id, fields)
+
+    def delete(self, reading_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM readings WHERE id = ?", (reading_id,))
+
+    def query(self, name=None, start=None, end=None):
+        """Readings of a profile (all when None) within [start, end], as a ReadingView.
+
+        name is matched case-insensitively and start and end are inclusive
+        epoch seconds or timestamp strings. Stored timestamps sort
+        chronologically as text, so filtering and ordering run on the indexes.
+        """
+        clauses, params = [], []
+        if name is not None:
+            clauses.append("name = ?")
+            params.append(name.strip())
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(format_timestamp(to_epoch(start)))
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(format_timestamp(to_epoch(end)))
+        sql = "SELECT id, timestamp, name, pH, temperature, ammonia FROM readings"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        store = ReadingStore()
+        store.extend(self._rows_to_dicts(self.conn.execute(sql + " ORDER BY timestamp", params).fetchall()))
+        return store.view()
+
+    def totals(self):
+        """(RunningTotals of every reading, lower-cased profile names), summed by SQLite."""
+        sums = ", ".join(f"SUM({f}), SUM({f} * {f})" for f in FIELDS)
+        row = self.conn.execute(f"SELECT COUNT(*), MIN(timestamp), MAX(timestamp), {sums} FROM readings").fetchone()
+        overall = RunningTotals()
+        if row[0]:
+            overall.count = row[0]
+            overall.first, overall.last = parse_timestamp(row[1]), parse_timestamp(row[2])
+            for k, f in enumerate(FIELDS):
+                overall.sums[f], overall.squares[f] = row[3 + 2 * k], row[4 + 2 * k]
+        names = {name.strip().lower() for name, in self.conn.execute("SELECT DISTINCT name FROM readings")}
+        return overall, names
+
+    def journaled_profiles(self):
+        # Every change goes straight into the table
+        return set()
+
+    def needs_compaction(self):
+        return False
+
+    def save_from(self, store, loaded=None):
+        """Replace the table with the store, or only the profiles in loaded (see PartitionedStorage)."""
+        if loaded is None:
+            self.write_snapshot(store.rows())
+            return
+        with self.conn:
+            self.conn.executemany("DELETE FROM readings WHERE name = ?", [(key,) for key in loaded])
+            self.conn.executemany(
+                "INSERT INTO readings (id, timestamp, name, pH, temperature, ammonia) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(r.get(c) for c in COLUMNS) for r in store.rows()],
+            )
+
+    def write_snapshot(self, records):
+        with self.conn:
+            self.conn.execute("DELETE FROM readings")
+            self.conn.executemany(
+                "INSERT INTO readings (id, timestamp, name, pH, temperature, ammonia) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(r.get(c) for c in COLUMNS) for r in records],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    from .migrate import main
+    main(SQLiteStorage, "readings.db")
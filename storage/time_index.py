@@ -0,0 +1,146 @@
+"""Per-profile time-ordered index over a ReadingStore"""
+
+import numpy as np
+
+
+class SortedRows:
+    """Store row positions kept sorted by timestamp, with room to grow."""
+
+    def __init__(self, timestamps, rows):
+        self.size = len(rows)
+        capacity = max(self.size, 16)
+        self._ts = np.empty(capacity, dtype=np.int64)
+        self._rows = np.empty(capacity, dtype=np.intp)
+        self._ts[:self.size] = timestamps
+        self._rows[:self.size] = rows
+
+    @property
+    def timestamps(self):
+        return self._ts[:self.size]
+
+    @property
+    def rows(self):
+        return self._rows[:self.size]
+
+    def insert(self, timestamp, row):
+        if self.size == len(self._ts):
+            self._ts = np.concatenate([self._ts, np.empty_like(self._ts)])
+            self._rows = np.concatenate([self._rows, np.empty_like(self._rows)])
+        if not self.size or timestamp >= self._ts[self.size - 1]:
+            # New readings almost always arrive in time order
+            i = self.size
+        else:
+            i = int(np.searchsorted(self.timestamps, timestamp, side="right"))
+            self._ts[i + 1:self.size + 1] = self._ts[i:self.size].copy()
+            self._rows[i + 1:self.size + 1] = self._rows[i:self.size].copy()
+        self._ts[i] = timestamp
+        self._rows[i] = row
+        self.size += 1
+
+    def insert_many(self, timestamps, rows):
+        """insert() for a batch: one merge instead of a shift per row."""
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, rows = timestamps[order], rows[order]
+        at = np.searchsorted(self.timestamps, timestamps, side="right")
+        merged_ts = np.insert(self.timestamps, at, timestamps)
+        merged_rows = np.insert(self.rows, at, rows)
+        self.size = len(merged_ts)
+        self._ts = np.empty(max(self.size * 2, 16), dtype=np.int64)
+        self._rows = np.empty(len(self._ts), dtype=np.intp)
+        self._ts[:self.size] = merged_ts
+        self._rows[:self.size] = merged_rows
+
+    def remove(self, timestamp, row):
+        lo = int(np.searchsorted(self.timestamps, timestamp, side="left"))
+        hi = int(np.searchsorted(self.timestamps, timestamp, side="right"))
+        hits = np.flatnonzero(self._rows[lo:hi] == row)
+        if not len(hits):
+            return
+        i = lo + int(hits[0])
+        self._ts[i:self.size - 1] = self._ts[i + 1:self.size].copy()
+        self._rows[i:self.size - 1] = self._rows[i + 1:self.size].copy()
+        self.size -= 1
+
+    def window(self, start, end, limit=None):
+        """Row positions with start <= timestamp <= end, in time order.
+
+        limit keeps only the latest rows of the window; only those are copied.
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, start, side="left"))
+        hi = self.size if end is None else int(np.searchsorted(self.timestamps, end, side="right"))
+        if limit is not None:
+            lo = max(lo, hi - limit)
+        return self.rows[lo:hi].copy()
+
+
+class TimeIndex:
+    """Row positions of every profile (and of all readings) sorted by time.
+
+    Profiles are keyed by lower-cased name; the None key covers all
+    readings. Each list is built on first use with one argsort and then kept
+    up to date by add() and remove(), so a time window is two binary
+    searches plus a slice. Vacuuming the store moves rows, which drops
+    every list until it is next used.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.generation = store.generation
+        self.profiles = {}
+
+    @staticmethod
+    def _keys(name):
+        return (name.strip().lower(), None)
+
+    def _check_generation(self):
+        if self.generation != self.store.generation:
+            self.generation = self.store.generation
+            self.profiles = {}
+
+    def add(self, name, row, timestamp):
+        self._check_generation()
+        for key in self._keys(name):
+            entry = self.profiles.get(key)
+            if entry is not None:
+                entry.insert(timestamp, row)
+
+    def add_rows(self, rows):
+        """add() for a batch of store rows."""
+        self._check_generation()
+        store = self.store
+        rows = np.asarray(rows, dtype=np.intp)
+        codes, timestamps = store.codes[rows], store.timestamps[rows]
+        entry = self.profiles.get(None)
+        if entry is not None:
+            entry.insert_many(timestamps, rows)
+        for code in np.unique(codes).tolist():
+            entry = self.profiles.get(store.names[code].strip().lower())
+            if entry is not None:
+                mask = codes == code
+                entry.insert_many(timestamps[mask], rows[mask])
+
+    def remove(self, name, row, timestamp):
+        self._check_generation()
+        for key in self._keys(name):
+            entry = self.profiles.get(key)
+            if entry is not None:
+                entry.remove(timestamp, row)
+
+    def sorted_rows(self, name=None):
+        self._check_generation()
+        key = None if name is None else name.strip().lower()
+        entry = self.profiles.get(key)
+        if entry is None:
+            store = self.store
+            if key is None:
+                rows = store.live_indices()
+            else:
+                rows = np.flatnonzero(np.isin(store.codes, store.codes_matching(key)) & store.alive)
+            timestamps = store.timestamps[rows]
+            order = np.argsort(timestamps, kind="stable")
+            entry = SortedRows(timestamps[order], rows[order])
+            self.profiles[key] = entry
+        return entry
+
+    def window(self, name=None, start=None, end=None, limit=None):
+        return self.sorted_rows(name).window(start, end, limit)
@@ -0,0 +1,152 @@
+"""Write-behind wrapper that moves storage writes off the calling thread"""
+
+import threading
+from collections import deque
+from .column_store import ReadingStore
+
+
+class WriteBehindStorage:
+    """Queues writes to a storage engine and applies them on a worker thread.
+
+    append/update/delete return immediately; consecutive writes of the same
+    kind are coalesced into one append_many(), update_many() or run of
+    deletes. save_from() takes a copy of the store's columns right away, so
+    the caller can keep changing the store while the snapshot is written.
+    Writes reach the engine in the order they were made.
+
+    flush() blocks until the queue is empty and re-raises the first error a
+    background write hit; load_into(), query() and totals() flush first, so
+    reads always see every earlier change. The error stays set, and every
+    flush() raises it, until a snapshot written after the failure succeeds:
+    only a full snapshot brings back what the failed write lost. close()
+    flushes and stops the worker.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.running = None
+        self.closed = False
+        self.error = None
+        self.worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.worker.start()
+
+    def _enqueue(self, kind, payload):
+        with self.condition:
+            if self.closed:
+                raise ValueError("Storage is closed")
+            last = self.pending[-1] if self.pending else None
+            if last is not None and last[0] == kind and kind != "snapshot":
+                if kind == "update":
+                    for reading_id, fields in payload.items():
+                        last[1].setdefault(reading_id, {}).update(fields)
+                else:
+                    last[1].extend(payload)
+            elif last is not None and kind == "snapshot" and last[0] == "snapshot":
+                # The newer snapshot already holds everything the older one would write
+                self.pending[-1] = (kind, payload)
+            else:
+                self.pending.append((kind, payload))
+            self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                kind, payload = self.pending.popleft()
+                self.running = kind
+            try:
+                if kind == "append":
+                    self.storage.append_many(payload)
+                elif kind == "update":
+                    self.storage.update_many(payload)
+                elif kind == "delete":
+                    for reading_id in payload:
+                        self.storage.delete(reading_id)
+                else:
+                    self.storage.save_from(*payload)
+                    with self.condition:
+                        # Taken after every earlier write, so it holds what failed
+                        self.error = None
+            except Exception as e:
+                # Keep going; the owner has to queue a snapshot to clear this
+                with self.condition:
+                    self.error = self.error or e
+            finally:
+                with self.condition:
+                    self.running = None
+                    self.condition.notify_all()
+
+    def append(self, record):
+        self._enqueue("append", [record])
+
+    def append_many(self, records):
+        self._enqueue("append", list(records))
+
+    def update(self, reading_id, fields):
+        self._enqueue("update", {reading_id: dict(fields)})
+
+    def update_many(self, patches):
+        self._enqueue("update", {reading_id: dict(fields) for reading_id, fields in patches.items()})
+
+    def delete(self, reading_id):
+        self._enqueue("delete", [reading_id])
+
+    def needs_compaction(self):
+        with self.condition:
+            # A queued or running snapshot is about to truncate the journal
+            if self.running == "snapshot" or any(kind == "snapshot" for kind, _ in self.pending):
+                return False
+        return self.storage.needs_compaction()
+
+    def save_from(self, store, *loaded):
+        # Let go of a memory-mapped file before it gets replaced, as
+        # RecordStorage.save_from() does for a synchronous save
+        store.detach()
+        snapshot = ReadingStore()
+        snapshot.attach(*store.columns())
+        self._enqueue("snapshot", (snapshot, *loaded))
+
+    def load_into(self, store, progress=None):
+        self.flush()
+        return self.storage.load_into(store, progress)
+
+    def query(self, *args, **kwargs):
+        self.flush()
+        return self.storage.query(*args, **kwargs)
+
+    def totals(self):
+        self.flush()
+        return self.storage.totals()
+
+    def journaled_profiles(self):
+        self.flush()
+        return self.storage.journaled_profiles()
+
+    def flush(self):
+        """Wait until every queued write is applied; raises the first unrepaired error."""
+        with self.condition:
+            while self.pending or self.running:
+                self.condition.wait()
+            error = self.error
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Flush, stop the worker and close the engine. Safe to call twice."""
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            self.worker.join()
+            close = getattr(self.storage, "close", None)
+            if close:
+                close()
@@ -0,0 +1,186 @@
+"""Collector and BatchWriter against in-process fake probes and a local TCP probe"""
+
+import asyncio
+import threading
+import time
+import pytest
+from data_model import ReadingManager
+from ingest import collector as collector_module
+from ingest.collector import Collector, FakeProbe, TcpProbe
+from ingest.daemon import IngestDaemon, SpoolDirectory
+from ingest.writer import BatchWriter
+
+
+class RecordingWriter(BatchWriter):
+    """BatchWriter that remembers every batch handed to write()."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batches = []
+
+    def write(self, batch):
+        self.batches.append((time.monotonic(), len(batch)))
+        return super().write(batch)
+
+
+class BlockingWriter(RecordingWriter):
+    """Writer whose writes wait until release is set, like a stalled disk."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def write(self, batch):
+        self.release.wait()
+        return super().write(batch)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # ReadingManager keeps users/ under the current folder
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(collector_module, "RETRY_DELAY", 0.01)
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.005)
+
+
+async def run_until(collector, condition, timeout=5.0):
+    """Run the collector until condition() holds, then stop it and wait for the final write."""
+    running = asyncio.create_task(collector.run())
+    try:
+        await wait_for(condition, timeout)
+    finally:
+        collector.stop()
+        await running
+
+
+def stored_readings(username):
+    return ReadingManager(username).get_all()
+
+
+def test_batches_by_size():
+    writer = RecordingWriter("size", batch_size=5)
+    probes = [FakeProbe(f"Tank {i}", interval=0.002, seed=i) for i in range(4)]
+    collector = Collector(writer, probes, flush_interval=60.0)
+
+    asyncio.run(run_until(collector, lambda: len(writer.batches) >= 3))
+
+    sizes = [size for _, size in writer.batches]
+    # Nothing waits out the minute-long interval; only the batch flushed at stop may be short
+    assert all(size == 5 for size in sizes[:-1])
+    assert 0 < sizes[-1] <= 5
+    assert writer.written == collector.polled == sum(sizes)
+    assert len(stored_readings("size")) == writer.written
+
+
+def test_batches_by_interval():
+    writer = RecordingWriter("interval", batch_size=1000)
+    collector = Collector(writer, [FakeProbe("Tank", interval=0.01, seed=1)], flush_interval=0.05)
+
+    async def scenario():
+        running = asyncio.create_task(collector.run())
+        await wait_for(lambda: len(writer.batches) >= 2)
+        stopped = time.monotonic()
+        collector.stop()
+        await running
+        return stopped
+
+    stopped = asyncio.run(scenario())
+
+    # Partial batches were written while polling went on, not only at stop
+    written_before_stop = [size for at, size in writer.batches if at < stopped]
+    assert len(written_before_stop) >= 2
+    assert all(size < 1000 for size in written_before_stop)
+    assert writer.written == collector.polled
+    assert len(stored_readings("interval")) == writer.written
+
+
+def test_bounded_queue_holds_probes_back():
+    writer = BlockingWriter("backpressure", batch_size=1)
+    probes = [FakeProbe(f"Tank {i}", interval=0.001, seed=i) for i in range(3)]
+    collector = Collector(writer, probes, queue_size=2, flush_interval=0.0)
+
+    async def scenario():
+        running = asyncio.create_task(collector.run())
+        # One reading is stuck in the write, two fill the queue, every poller waits in put()
+        await wait_for(lambda: collector.queue is not None and collector.queue.full())
+        await asyncio.sleep(0.1)
+        assert collector.polled == 3
+        assert collector.queue.qsize() == 2
+        writer.release.set()
+        await wait_for(lambda: writer.written >= 10)
+        collector.stop()
+        await running
+
+    asyncio.run(scenario())
+    assert writer.written == collector.polled
+    assert len(stored_readings("backpressure")) == writer.written
+
+
+def test_tcp_probe_reconnects_after_error():
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        if len(connections) == 1:
+            # First connection drops before answering, like a probe rebooting
+            writer.close()
+            return
+        while await reader.readline():
+            writer.write(b"ignored,7.1,25.5,0.02\n")
+            await writer.drain()
+        writer.close()
+
+    writer = RecordingWriter("tcp", batch_size=1)
+
+    async def scenario():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        probe = TcpProbe("Reef Tank", "127.0.0.1", port, interval=0.01, timeout=1.0)
+        collector = Collector(writer, [probe], flush_interval=0.0)
+        async with server:
+            await run_until(collector, lambda: writer.written >= 2)
+        return collector
+
+    collector = asyncio.run(scenario())
+
+    assert collector.failures == 1
+    assert len(connections) == 2
+    readings = stored_readings("tcp")
+    assert len(readings) == writer.written
+    assert {r["name"] for r in readings} == {"Reef Tank"}
+    assert readings[0]["pH"] == 7.1 and readings[0]["timestamp"]
+
+
+def test_writer_gives_every_reading_a_new_id():
+    writer = BatchWriter("ids")
+    reading = {"name": "Tank", "pH": 7.0, "temperature": 25.0, "ammonia": 0.1, "id": 5}
+    assert writer.write([dict(reading), dict(reading)]) == 2
+    writer.close()
+
+    readings = stored_readings("ids")
+    # Loading would drop an append whose id is already taken
+    assert len(readings) == 2
+    assert len({r["id"] for r in readings}) == 2 and 5 not in {r["id"] for r in readings}
+
+
+class FailingWriter(BatchWriter):
+    def write(self, batch):
+        raise OSError("disk full")
+
+
+def test_daemon_releases_lock_after_write_error(tmp_path):
+    spool = SpoolDirectory(str(tmp_path / "spool"))
+    with open(tmp_path / "spool" / "a.jsonl", "w") as f:
+        f.write('{"name": "Tank", "pH": 7.0, "temperature": 25.0, "ammonia": 0.1}\n')
+    daemon = IngestDaemon(FailingWriter("daemon"), spool, use_stdin=False)
+
+    with pytest.raises(OSError):
+        daemon.run()
+    ReadingManager.lock_user("daemon").release()
@@ -0,0 +1,102 @@
+"""ReadingManager validation, ids and edits against a temporary users folder"""
+
+import numpy as np
+import pytest
+from data_model import ReadingManager, validate_readings
+
+
+def reading(**fields):
+    return {"name": "Tank", "pH": 7.0, "temperature": 25.0, "ammonia": 0.1,
+            "timestamp": "2024-01-01 10:00", **fields}
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # ReadingManager keeps users/ under the current folder
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.mark.parametrize("reading_id, message", [
+    ("x", "Reading id must be a whole number."),
+    (1.5, "Reading id must be a whole number."),
+    (True, "Reading id must be a whole number."),
+    (2 ** 70, "Reading id is out of range."),
+])
+def test_rejects_invalid_ids(reading_id, message):
+    manager = ReadingManager("ids")
+    ids, rejects = manager.add_readings([reading(id=1), reading(id=reading_id), reading()])
+    assert rejects == [(1, message)]
+    assert ids[0] == 1 and len(ids) == 2
+
+    stored = ReadingManager("ids").get_all()
+    assert sorted(r["id"] for r in stored) == sorted(ids)
+
+
+def test_keeps_valid_ids():
+    records, rejects = validate_readings([reading(id=42), reading(id=-(2 ** 63))])
+    assert not rejects
+    assert [r["id"] for r in records] == [42, -(2 ** 63)]
+
+
+def test_failed_patch_set_changes_nothing():
+    manager = ReadingManager("patch")
+    (first, second), _ = manager.add_readings([reading(), reading(name="Other")])
+    events = []
+    manager.subscribe(events.append)
+
+    with pytest.raises(ValueError):
+        manager.update_many({first: {"pH": 8.0}, second: {"pH": "abc"}})
+
+    assert manager.get(first)["pH"] == 7.0 and manager.get(second)["pH"] == 7.0
+    assert not events
+    assert [r["pH"] for r in ReadingManager("patch").get_all()] == [7.0, 7.0]
+
+
+@pytest.mark.parametrize("fields", [{"name": ""}, {"name": "123"}, {"pH": 99}, {"ammonia": float("nan")}])
+def test_update_validates_values(fields):
+    manager = ReadingManager("update")
+    (reading_id,), _ = manager.add_readings([reading()])
+    with pytest.raises(ValueError):
+        manager.update(reading_id, **fields)
+    assert manager.get(reading_id)["name"] == "Tank" and manager.get(reading_id)["pH"] == 7.0
+
+
+def test_update_many_applies_valid_patches():
+    manager = ReadingManager("patch")
+    (first, second), _ = manager.add_readings([reading(), reading(name="Other")])
+    manager.update_many({first: {"pH": "8.5"}, second: {"name": "Reef"}})
+
+    stored = {r["id"]: r for r in ReadingManager("patch").get_all()}
+    assert stored[first]["pH"] == 8.5
+    assert stored[second]["name"] == "Reef"
+
+
+@pytest.mark.parametrize("engine", ["partitioned", "sharded", "sqlite"])
+def test_adding_reads_and_saves_only_that_profile(engine):
+    manager = ReadingManager("partial", engine)
+    manager.add_readings([reading(name=name, timestamp=f"2024-0{month}-01 10:00")
+                          for name in ("Tank", "Other") for month in (1, 2)])
+    manager.save_readings()
+
+    manager = ReadingManager("partial")
+    (new_id,), _ = manager.add_readings([reading(timestamp="2024-02-02 10:00")])
+    manager.save_readings()
+    assert manager.loaded == {"tank"}
+    assert manager.totals().count == 5 and manager.profile_count() == 2
+
+    stored = ReadingManager("partial").get_all()
+    assert sorted(r["name"] for r in stored) == ["Other", "Other", "Tank", "Tank", "Tank"]
+    assert new_id in {r["id"] for r in stored}
+
+
+@pytest.mark.parametrize("engine", ["sqlite", "json"])
+def test_close_saves_built_rollups(engine):
+    manager = ReadingManager("rollups", engine)
+    manager.add_readings([reading(), reading(timestamp="2024-01-02 10:00")])
+    manager.rollups("Tank")
+    manager.close()
+
+    with np.load(manager.pyramid_path) as saved:
+        assert saved["names"].tolist() == ["tank"]
+    manager = ReadingManager("rollups")
+    assert manager.rollup("Tank", "1d")["count"].tolist() == [1, 1]
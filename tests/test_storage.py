@@ -0,0 +1,124 @@
+"""Saving, reloading and journal replay for every storage engine"""
+
+import os
+import shutil
+
+import pytest
+from data_model import ReadingManager
+from storage.journal import JournalStorage
+
+ENGINES = list(ReadingManager.ENGINES)
+JOURNALED = [engine for engine in ENGINES if engine != "sqlite"]
+
+
+def reading(**fields):
+    return {"name": "Tank", "pH": 7.0, "temperature": 25.0, "ammonia": 0.1,
+            "timestamp": "2024-01-01 10:00", **fields}
+
+
+def stored(username):
+    return {r["id"]: r for r in ReadingManager(username).get_all()}
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # ReadingManager keeps users/ under the current folder
+    monkeypatch.chdir(tmp_path)
+
+
+def add_and_edit(manager):
+    """Add readings of two profiles in two months, then edit and delete some."""
+    ids, _ = manager.add_readings([reading(name=name, timestamp=f"2024-0{month}-0{day} 10:00", pH=6.0 + day)
+                                   for name in ("Tank", "Other") for month in (1, 2) for day in (1, 2)])
+    manager.update(ids[0], pH=8.5)
+    manager.update_many({ids[1]: {"ammonia": 0.5}, ids[4]: {"name": "Reef"}})
+    manager.delete(ids[2])
+    return ids
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_save_and_reload_round_trip(engine):
+    manager = ReadingManager("round", engine)
+    ids = add_and_edit(manager)
+    expected = {r["id"]: r for r in manager.get_all()}
+    manager.save_readings()
+    manager.close()
+
+    assert stored("round") == expected
+    assert sorted(expected) == sorted(ids[:2] + ids[3:])
+    assert expected[ids[0]]["pH"] == 8.5 and expected[ids[1]]["ammonia"] == 0.5
+    assert expected[ids[4]]["name"] == "Reef"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_ids_survive_reload_without_a_save(engine):
+    manager = ReadingManager("unsaved", engine)
+    ids = add_and_edit(manager)
+    expected = {r["id"]: r for r in manager.get_all()}
+    manager.close()
+
+    assert stored("unsaved") == expected
+    # Reloading again must not hand out new ids either
+    assert sorted(stored("unsaved")) == sorted(ids[:2] + ids[3:])
+
+
+@pytest.mark.parametrize("engine", JOURNALED)
+def test_replays_journal_left_by_interrupted_save(engine):
+    manager = ReadingManager("crash", engine)
+    manager.add_readings([reading(timestamp="2024-01-05 10:00")])
+    manager.save_readings()
+    add_and_edit(manager)
+    expected = {r["id"]: r for r in manager.get_all()}
+
+    # Crash after the snapshot is replaced but before the journal is removed
+    journal_path = manager.storage.journal_path
+    shutil.copy(journal_path, journal_path + ".kept")
+    manager.save_readings()
+    manager.close()
+    assert not os.path.exists(journal_path)
+    os.replace(journal_path + ".kept", journal_path)
+
+    assert stored("crash") == expected
+
+
+@pytest.mark.parametrize("engine", JOURNALED)
+def test_compacts_journal_past_threshold(engine, monkeypatch):
+    monkeypatch.setattr(JournalStorage, "COMPACT_THRESHOLD", 3)
+    manager = ReadingManager("compact", engine)
+    ids = [manager.add_readings([reading(timestamp=f"2024-01-0{day} 10:00")])[0][0] for day in (1, 2, 3)]
+    assert not os.path.exists(manager.storage.journal_path)
+
+    manager.update(ids[0], pH=9.0)
+    assert os.path.exists(manager.storage.journal_path)
+    saved = stored("compact")
+    assert sorted(saved) == sorted(ids) and saved[ids[0]]["pH"] == 9.0
+
+
+@pytest.mark.parametrize("engine", ["json", "sqlite", "partitioned"])
+def test_query_windows(engine):
+    manager = ReadingManager("window", engine)
+    manager.add_readings([reading(name=name, timestamp=f"2024-01-0{day} 10:00", pH=6.0 + day)
+                          for day in (3, 1, 4, 2) for name in ("Tank", "Other")])
+    manager.save_readings()
+
+    for manager in (manager, ReadingManager("window")):
+        assert manager.query("tank").ph.tolist() == [7.0, 8.0, 9.0, 10.0]
+        assert manager.query("Tank", "2024-01-02 10:00", "2024-01-03 10:00").ph.tolist() == [8.0, 9.0]
+        assert manager.query("Tank", start="2024-01-02 12:00", limit=1).ph.tolist() == [10.0]
+        assert len(manager.query("Tank", end="2023-12-31 00:00")) == 0
+        assert len(manager.query()) == 8
+
+
+@pytest.mark.parametrize("engine", ["json", "partitioned"])
+def test_saved_rollups_follow_later_edits(engine):
+    manager = ReadingManager("rollups", engine)
+    (first, _), _ = manager.add_readings([reading(), reading(name="Other")])
+    manager.rollups("Tank")
+    manager.rollups("Other")
+    manager.save_readings()
+    manager.update(first, pH=9.0)
+    manager.close()
+
+    manager = ReadingManager("rollups")
+    assert manager.rollup("Tank", "1d")["pH_mean"].tolist() == [9.0]
+    assert manager.rollup("Other", "1d")["pH_mean"].tolist() == [7.0]
@@ -6,4 +6,5 @@ from .dialogs import AboutDialog
 from .base_page import AquaPage
 from .styles import *
 from .components import *
-from .helpers import *
\ No newline at end of file
+from .helpers import *
+from .models import ReadingTableModel, ReadingFilterModel
\ No newline at end of file
@@ -4,6 +4,8 @@ from PyQt6.QtWidgets import QMessageBox, QApplication
 from PyQt6.QtGui import QPainter, QLinearGradient, QColor
 from PyQt6.QtCore import QPointF
 from .styles import MESSAGE_BOX_STYLE
+# Kept importable from here; the rules live in a Qt-free module
+from validation import ValidationHelper
 
 
 class PaintHelper:
@@ -17,56 +19,6 @@ class PaintHelper:
         painter.fillRect(widget.rect(), gradient)
 
 
-class ValidationHelper:
-    @staticmethod
-    def validate_not_empty(value, field_name):
-        if not value:
-            return False, f"{field_name} cannot be empty."
-        return True, ""
-    
-    @staticmethod
-    def validate_no_spaces(value, field_name):
-        if " " in value:
-            return False, f"{field_name} cannot contain spaces."
-        return True, ""
-    
-    @staticmethod
-    def validate_not_numeric_only(value, field_name):
-        if value.isnumeric():
-            return False, f"{field_name} must contain letters."
-        return True, ""
-    
-    @staticmethod
-    def validate_range(value, min_val, max_val, field_name):
-        try:
-            num = float(value)
-            if num < min_val or num > max_val:
-                return False, f"{field_name} must be between {min_val} and {max_val}."
-            return True, ""
-        except ValueError:
-            return False, f"{field_name} must be a valid number."
-    
-    @staticmethod
-    def validate_water_params(ph, temp, ammonia):
-        errors = []
-        
-        valid, msg = ValidationHelper.validate_range(ph, 0, 14, "pH")
-        if not valid:
-            errors.append(msg)
-        
-        valid, msg = ValidationHelper.validate_range(temp, 0, 40, "Temperature")
-        if not valid:
-            errors.append(msg)
-        
-        valid, msg = ValidationHelper.validate_range(ammonia, 0, 10, "Ammonia")
-        if not valid:
-            errors.append(msg)
-        
-        if errors:
-            return False, "\n".join(errors)
-        return True, ""
-
-
 class DialogHelper:
     @staticmethod
     def show_error(parent, title, message):
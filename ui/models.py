@@ -0,0 +1,298 @@
+"""Item models over the reading store"""
+
+import numpy as np
+from PyQt6.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+from PyQt6.QtGui import QColor
+from storage.column_store import format_timestamp
+
+
+class ReadingTableModel(QAbstractTableModel):
+    """Virtual table over a ReadingStore.
+
+    The model only keeps the ids and name codes of the rows it shows; cell
+    text is formatted in data() on demand, so Qt only pays for the rows that
+    are visible. In
+    edit mode, edited cells are kept in pending_edits ({id: {field: text}})
+    until the page commits or discards them.
+    """
+
+    HEADERS = ["Timestamp", "Name", "pH", "Temperature (°C)", "Ammonia (ppm)"]
+    # column -> (reading field, decimals shown)
+    COLUMNS = [("timestamp", None), ("name", None), ("pH", 2), ("temperature", 1), ("ammonia", 2)]
+    HIGHLIGHT_COLOR = QColor("#4A5F7F")
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int32)
+        self.editable = False
+        self.highlight_row = -1
+        self.pending_edits = {}
+
+    def set_view(self, view):
+        """Show the rows of a ReadingView."""
+        self.beginResetModel()
+        self.ids = view.ids.copy()
+        self.codes = view.codes.copy()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def reading_id(self, row):
+        if 0 <= row < len(self.ids):
+            return int(self.ids[row])
+        return None
+
+    def row_of(self, reading_id):
+        hits = np.flatnonzero(self.ids == reading_id)
+        return int(hits[0]) if len(hits) else -1
+
+    def value(self, row, field):
+        """Stored value of one field, read straight from the store columns."""
+        pos = self.store.position(self.reading_id(row))
+        if pos is None:
+            return ""
+        if field == "timestamp":
+            return format_timestamp(self.store.timestamps[pos])
+        if field == "name":
+            return self.store.names[self.store.codes[pos]]
+        return float(self.store.column(field)[pos])
+
+    def stored_text(self, row, column):
+        field, decimals = self.COLUMNS[column]
+        value = self.value(row, field)
+        if decimals is None or value == "":
+            return str(value)
+        return f"{value:.{decimals}f}"
+
+    def text(self, row, column):
+        """Cell text, showing a pending edit if there is one."""
+        field = self.COLUMNS[column][0]
+        pending = self.pending_edits.get(self.reading_id(row), {})
+        if field in pending:
+            return pending[field]
+        return self.stored_text(row, column)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.text(row, column)
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role == Qt.ItemDataRole.UserRole:
+            return self.reading_id(row)
+        if role == Qt.ItemDataRole.BackgroundRole and self.editable:
+            field = self.COLUMNS[column][0]
+            if row == self.highlight_row or field in self.pending_edits.get(self.reading_id(row), {}):
+                return self.HIGHLIGHT_COLOR
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        # Timestamps are never editable
+        if self.editable and index.column() > 0:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        """Record an edit in pending_edits; the store is not touched."""
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole or not self.editable or index.column() == 0:
+            return False
+        row, column = index.row(), index.column()
+        reading_id = self.reading_id(row)
+        field = self.COLUMNS[column][0]
+        text = str(value).strip()
+
+        fields = self.pending_edits.setdefault(reading_id, {})
+        if text == self.stored_text(row, column):
+            fields.pop(field, None)
+            if not fields:
+                del self.pending_edits[reading_id]
+        else:
+            fields[field] = text
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_editable(self, editable, highlight_row=-1):
+        """Enter or leave edit mode; leaving discards pending edits."""
+        self.editable = editable
+        self.highlight_row = highlight_row if editable else -1
+        if not editable:
+            self.pending_edits = {}
+        if len(self.ids):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.ids) - 1, len(self.COLUMNS) - 1))
+
+    def append_ids(self, reading_ids):
+        if not reading_ids:
+            return
+        start = len(self.ids)
+        codes = [self.store.codes[self.store.position(i)] for i in reading_ids]
+        self.beginInsertRows(QModelIndex(), start, start + len(reading_ids) - 1)
+        self.ids = np.concatenate([self.ids, np.asarray(reading_ids, dtype=np.int64)])
+        self.codes = np.concatenate([self.codes, np.asarray(codes, dtype=np.int32)])
+        self.endInsertRows()
+
+    def refresh_row(self, row):
+        pos = self.store.position(self.reading_id(row))
+        if pos is not None:
+            self.codes[row] = self.store.codes[pos]
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.COLUMNS) - 1))
+
+    def remove_row(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.ids = np.delete(self.ids, row)
+        self.codes = np.delete(self.codes, row)
+        self.endRemoveRows()
+
+
+class ReadingFilterModel(QAbstractProxyModel):
+    """Profile-name prefix filter over a ReadingTableModel.
+
+    The accepted source rows are kept as a sorted index array. Filtering is a
+    single lookup of the source model's name-code column in a table built from
+    the store's prefix index, instead of one filterAcceptsRow() call per row
+    as with QSortFilterProxyModel.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.prefix = ""
+        self.rows = np.empty(0, dtype=np.intp)
+        self._removing = None
+
+    def setSourceModel(self, model):
+        super().setSourceModel(model)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self._on_source_reset)
+        model.rowsInserted.connect(self._on_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self._on_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self._on_rows_removed)
+        model.dataChanged.connect(self._on_data_changed)
+        self.beginResetModel()
+        self._on_source_reset()
+
+    def _accepted(self, start=0, stop=None):
+        """Boolean mask over source rows [start, stop)."""
+        source = self.sourceModel()
+        codes = source.codes[start:stop]
+        if not self.prefix:
+            return np.ones(len(codes), dtype=bool)
+        table = np.zeros(len(source.store.names), dtype=bool)
+        table[source.store.codes_with_prefix(self.prefix)] = True
+        return table[codes]
+
+    def set_prefix(self, prefix):
+        prefix = prefix.strip()
+        if prefix == self.prefix:
+            return
+        self.beginResetModel()
+        self.prefix = prefix
+        self.rows = np.flatnonzero(self._accepted())
+        self.endResetModel()
+
+    def source_row(self, row):
+        if 0 <= row < len(self.rows):
+            return int(self.rows[row])
+        return -1
+
+    def _on_source_reset(self):
+        self.rows = np.flatnonzero(self._accepted())
+        self.endResetModel()
+
+    def _on_rows_inserted(self, parent, first, last):
+        self.rows[self.rows >= first] += last - first + 1
+        new = first + np.flatnonzero(self._accepted(first, last + 1))
+        if not len(new):
+            return
+        pos = int(np.searchsorted(self.rows, first))
+        self.beginInsertRows(QModelIndex(), pos, pos + len(new) - 1)
+        self.rows = np.insert(self.rows, pos, new)
+        self.endInsertRows()
+
+    def _on_rows_about_to_be_removed(self, parent, first, last):
+        lo = int(np.searchsorted(self.rows, first))
+        hi = int(np.searchsorted(self.rows, last, side="right"))
+        self._removing = (lo, hi, last - first + 1)
+        if hi > lo:
+            self.beginRemoveRows(QModelIndex(), lo, hi - 1)
+
+    def _on_rows_removed(self, parent, first, last):
+        lo, hi, count = self._removing
+        self._removing = None
+        rows = np.delete(self.rows, np.s_[lo:hi])
+        rows[lo:] -= count
+        self.rows = rows
+        if hi > lo:
+            self.endRemoveRows()
+
+    def _on_data_changed(self, top_left, bottom_right, roles=()):
+        first, last = top_left.row(), bottom_right.row()
+        wanted = first + np.flatnonzero(self._accepted(first, last + 1))
+        lo = int(np.searchsorted(self.rows, first))
+        hi = int(np.searchsorted(self.rows, last, side="right"))
+
+        # An edited name can move a row in or out of the filter
+        if not np.array_equal(self.rows[lo:hi], wanted):
+            for source_row in np.setdiff1d(self.rows[lo:hi], wanted)[::-1]:
+                pos = int(np.searchsorted(self.rows, source_row))
+                self.beginRemoveRows(QModelIndex(), pos, pos)
+                self.rows = np.delete(self.rows, pos)
+                self.endRemoveRows()
+            for source_row in np.setdiff1d(wanted, self.rows):
+                pos = int(np.searchsorted(self.rows, source_row))
+                self.beginInsertRows(QModelIndex(), pos, pos)
+                self.rows = np.insert(self.rows, pos, source_row)
+                self.endInsertRows()
+            lo = int(np.searchsorted(self.rows, first))
+            hi = int(np.searchsorted(self.rows, last, side="right"))
+
+        if hi > lo:
+            self.dataChanged.emit(self.index(lo, top_left.column()),
+                                  self.index(hi - 1, bottom_right.column()), roles)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        source = self.sourceModel()
+        return 0 if parent.isValid() or source is None else source.columnCount()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(int(self.rows[proxy_index.row()]), proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        pos = int(np.searchsorted(self.rows, source_index.row()))
+        if pos < len(self.rows) and self.rows[pos] == source_index.row():
+            return self.index(pos, source_index.column())
+        return QModelIndex()
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal:
+            return self.sourceModel().headerData(section, orientation, role)
+        if role == Qt.ItemDataRole.DisplayRole:
+            return section + 1
+        return None
@@ -286,7 +286,7 @@ DROPDOWN_FRAME_STYLE = """
 """
 
 TABLE_STYLE = """
-    QTableWidget {
+    QTableView {
         background: rgba(255, 255, 255, 0.05);
         color: #FFFFFF;
         border: 2px solid #293438;
@@ -0,0 +1,111 @@
+"""Input validation rules shared by the UI and the data model"""
+
+import math
+import re
+from datetime import datetime
+import numpy as np
+
+# "YYYY-MM-DD HH:MM" with optional seconds, as stored in readings files
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}(:\d{2})?")
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+# Reading field -> (lowest, highest, name in messages)
+PARAMETER_RANGES = {
+    "pH": (0, 14, "pH"),
+    "temperature": (0, 40, "Temperature"),
+    "ammonia": (0, 10, "Ammonia"),
+}
+
+
+class ValidationHelper:
+    @staticmethod
+    def validate_not_empty(value, field_name):
+        if not value:
+            return False, f"{field_name} cannot be empty."
+        return True, ""
+    
+    @staticmethod
+    def validate_no_spaces(value, field_name):
+        if " " in value:
+            return False, f"{field_name} cannot contain spaces."
+        return True, ""
+    
+    @staticmethod
+    def validate_not_numeric_only(value, field_name):
+        if value.isnumeric():
+            return False, f"{field_name} must contain letters."
+        return True, ""
+    
+    @staticmethod
+    def validate_range(value, min_val, max_val, field_name):
+        try:
+            num = float(value)
+            # NaN fails both comparisons below, and infinities break JSON output
+            if not math.isfinite(num):
+                return False, f"{field_name} must be a valid number."
+            if num < min_val or num > max_val:
+                return False, f"{field_name} must be between {min_val} and {max_val}."
+            return True, ""
+        except (TypeError, ValueError):
+            return False, f"{field_name} must be a valid number."
+    
+    @staticmethod
+    def validate_water_params(ph, temp, ammonia):
+        errors = []
+        for field, value in zip(PARAMETER_RANGES, (ph, temp, ammonia)):
+            valid, msg = ValidationHelper.validate_range(value, *PARAMETER_RANGES[field])
+            if not valid:
+                errors.append(msg)
+
+        if errors:
+            return False, "\n".join(errors)
+        return True, ""
+
+    @staticmethod
+    def validate_timestamp(value, field_name):
+        # fromisoformat() is much faster than strptime() but lenient, hence the pattern
+        if isinstance(value, str) and TIMESTAMP_PATTERN.fullmatch(value):
+            try:
+                datetime.fromisoformat(value)
+                return True, ""
+            except ValueError:
+                pass
+        return False, f"{field_name} must look like YYYY-MM-DD HH:MM[:SS]."
+
+    @staticmethod
+    def validate_id(value, field_name):
+        # bool is an int subclass, and the id column is int64
+        if isinstance(value, bool) or not isinstance(value, (int, np.integer)):
+            return False, f"{field_name} must be a whole number."
+        if not INT64_MIN <= value <= INT64_MAX:
+            return False, f"{field_name} is out of range."
+        return True, ""
+
+    @staticmethod
+    def validate_profile_name(name):
+        if not isinstance(name, str):
+            return False, "Profile name must be text."
+        for check in (ValidationHelper.validate_not_empty, ValidationHelper.validate_not_numeric_only):
+            valid, msg = check(name.strip(), "Profile name")
+            if not valid:
+                return False, msg
+        return True, ""
+
+    @staticmethod
+    def validate_field(field, value):
+        """One edited reading field: the profile name or a water parameter."""
+        if field == "name":
+            return ValidationHelper.validate_profile_name(value)
+        return ValidationHelper.validate_range(value, *PARAMETER_RANGES[field])
+
+    @staticmethod
+    def validate_reading(name, ph, temp, ammonia, timestamp=None):
+        """The input page's rules for one reading, plus the timestamp format if given."""
+        valid, msg = ValidationHelper.validate_profile_name(name)
+        if not valid:
+            return False, msg
+        valid, msg = ValidationHelper.validate_water_params(ph, temp, ammonia)
+        if not valid:
+            return False, msg
+        if timestamp is not None:
+            return ValidationHelper.validate_timestamp(timestamp, "Timestamp")
+        return True, ""